@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+bench_classify.py
+Lines/sec of the previous line classifier vs the single-alternation one.
+
+The previous LineScanner loop stripped every line, then ran RE_SETTING and up
+to eight tower-marker regexes per comment line and `T_RE` on a stripped copy of
+every `T` line. The current one dispatches on the first byte and classifies a
+comment with one `RE_COMMENT` match. Both run over the same in-memory lines
+(the EXECUTABLE_BLOCK of samples/input.gcode repeated `--scale` times) and
+must produce the same ScanResult.
+
+Usage:
+  PYTHONPATH=src python benchmarks/bench_classify.py --scale 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import time
+
+from bench_single_pass import scaled_sample
+
+from cfs_postproc.scan import (
+    RE_SETTING,
+    RE_X,
+    RE_Y,
+    SCAN_KEYS,
+    T_RE,
+    WT_ENDS,
+    WT_STARTS,
+    LineScanner,
+)
+
+
+def legacy_feed(self: LineScanner, lines, start: int = 0) -> LineScanner:
+    """LineScanner.feed() as it classified lines before RE_COMMENT."""
+    res = self.res
+    transitions = res.transitions
+    current_tool = self.current_tool
+    in_tower = self.in_tower
+    minx, miny, maxx, maxy = self.minx, self.miny, self.maxx, self.maxy
+
+    n = 0
+    for i, ln in enumerate(lines, start):
+        n += 1
+        s = ln.lstrip()
+        c = s[:1]
+        if c == b";":
+            m = RE_SETTING.match(ln)
+            if m:
+                setter = SCAN_KEYS.get(m.group(1).lower())
+                if setter is not None:
+                    setter(res, m.group(2), i)
+            elif any(p.match(ln) for p in WT_STARTS):
+                in_tower = True
+                continue
+            elif in_tower and any(p.match(ln) for p in WT_ENDS):
+                in_tower = False
+                continue
+        elif c == b"T":
+            mt = T_RE.match(s.rstrip())
+            if mt:
+                to_tool = int(mt.group(1))
+                if self.first_tool is None:
+                    self.first_tool = (i, to_tool)
+                if current_tool is not None and current_tool != to_tool:
+                    transitions.append((i, current_tool, to_tool))
+                current_tool = to_tool
+        if in_tower:
+            mx = RE_X.search(ln)
+            if mx:
+                x = float(mx.group(1))
+                minx = min(minx, x)
+                maxx = max(maxx, x)
+            my = RE_Y.search(ln)
+            if my:
+                y = float(my.group(1))
+                miny = min(miny, y)
+                maxy = max(maxy, y)
+
+    res.line_count += n
+    self.current_tool = current_tool
+    self.in_tower = in_tower
+    self.minx, self.miny, self.maxx, self.maxy = minx, miny, maxx, maxy
+    return self
+
+
+def run(name, fn, lines, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        res = fn(lines)
+        best = min(best, time.perf_counter() - t0)
+    print(f"{name:<8} {best:8.3f}s  {len(lines) / best / 1e6:7.2f} Mlines/s")
+    return best, res
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-line classifier micro-benchmark")
+    ap.add_argument("--scale", type=int, default=100, help="EXECUTABLE_BLOCK repetitions")
+    ap.add_argument("--repeat", type=int, default=5, help="Runs per variant (best is reported)")
+    args = ap.parse_args()
+
+    lines = scaled_sample(args.scale).encode("utf-8").splitlines(keepends=True)
+    # Comment and tool lines alone: the lines whose classification changed
+    marked = [ln for ln in lines if ln.lstrip()[:1] in (b";", b"T")]
+    for label, subset in (("all lines", lines), ("comment/T lines", marked)):
+        print(f"{label}: {len(subset)}")
+        t_old, a = run(
+            "previous", lambda ls: legacy_feed(LineScanner(), ls).finish(), subset, args.repeat
+        )
+        t_new, b = run("current", lambda ls: LineScanner().feed(ls).finish(), subset, args.repeat)
+        # Layer tracking was added after the previous classifier
+        b = copy.copy(b)
+        b.layer_lines, b.tower_layers = [], a.tower_layers
+        assert a == b, "classifiers disagree"
+        print(f"speedup: {t_old / t_new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
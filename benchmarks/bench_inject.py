@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+bench_inject.py
+Per-transition formatting vs precomputed injection templates.
+
+A synthetic job with `--changes` tool changes (cycling through T0..T3, with a
+few moves between them) is written to a temporary file and scanned once. The
+injected blocks for every transition are then rendered both ways:
+`render_transition()` formats each block from scratch, `TransitionTemplates`
+renders each (from, to) block once and reuses the bytes. The end-to-end time
+of the default (spliced) path is reported for scale.
+
+Usage:
+  PYTHONPATH=src python benchmarks/bench_inject.py --changes 50000
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from cfs_postproc.cfs_postproc import (
+    TransitionTemplates,
+    parse_args,
+    process_file,
+    render_transition,
+)
+from cfs_postproc.sparse import scan_file
+
+
+def synthetic(changes: int) -> bytes:
+    out = [b"; EXECUTABLE_BLOCK_START\n", b"T0\n"]
+    for n in range(1, changes + 1):
+        out.append(b";LAYER_CHANGE\nG1 X10 Y10 E1\nG1 X20 Y10 E1\nG1 X20 Y20 E1\n")
+        out.append(b"T%d\n" % (n % 4))
+    out.append(b"; EXECUTABLE_BLOCK_END\n")
+    return b"".join(out)
+
+
+def run(name, fn):
+    t0 = time.perf_counter()
+    res = fn()
+    dt = time.perf_counter() - t0
+    print(f"{name:<10} {dt:8.3f}s")
+    return dt, res
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-transition formatting vs injection templates")
+    ap.add_argument("--changes", type=int, default=50_000, help="Tool changes in the job")
+    opts = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "changes.gcode"
+        path.write_bytes(synthetic(opts.changes))
+        args = parse_args([str(path), str(Path(tmp) / "out.gcode"), "--m118-sentinels"])
+        park = (120.0, 150.0)
+        scan = scan_file(path)
+        data = path.read_bytes()
+        lines = [data[scan.offsets[i] :].split(b"\n", 1)[0] + b"\n" for i, _, _ in scan.transitions]
+        work = [(fr, to, ln) for (_, fr, to), ln in zip(scan.transitions, lines)]
+        print(f"input: {len(data) / 1e6:.1f} MB, {len(work)} transitions")
+
+        t_fmt, a = run(
+            "format", lambda: [render_transition(fr, to, ln, args, park) for fr, to, ln in work]
+        )
+        render = TransitionTemplates(args)
+        t_tpl, b = run("templates", lambda: [render(fr, to, ln, park) for fr, to, ln in work])
+        assert a == b, "renderers disagree"
+        print(f"speedup: {t_fmt / t_tpl:.2f}x")
+        run("end-to-end", lambda: process_file(args.infile, args.outfile, args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+bench_single_pass.py
+Compare the legacy multi-pass scan of cfs_postproc with the single-pass engine.
+
+The EXECUTABLE_BLOCK of samples/input.gcode is repeated `--scale` times to build
+a large in-memory job. Each variant runs over a list that counts how often it
+is iterated, so the report shows both full-file passes and wall time.
+
+Usage:
+  PYTHONPATH=src python benchmarks/bench_single_pass.py --scale 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import time
+from pathlib import Path
+
+from cfs_postproc.scan import T_RE, WT_ENDS, WT_STARTS, parse_matrix, scan_lines
+
+# Per-key metadata regexes of the legacy scan
+RE_FLUSH_MULT = re.compile(r"^\s*;\s*flush_multiplier\s*=\s*([0-9]*\.?[0-9]+)\s*$", re.I)
+RE_FLUSH_MATRIX = re.compile(r"^\s*;\s*flush_volumes_matrix\s*=\s*([0-9,\s]+)\s*$", re.I)
+RE_PRIME_VOLUME = re.compile(r"^\s*;\s*prime_volume\s*=\s*([0-9]+)\s*$", re.I)
+RE_ENABLE_PRIME_TOWER = re.compile(r"^\s*;\s*enable_prime_tower\s*=\s*([01])\s*$", re.I)
+# The legacy scan worked on decoded text; the engine's patterns are bytes
+LEGACY_WT_STARTS = [re.compile(p.pattern.decode(), re.I) for p in WT_STARTS]
+LEGACY_WT_ENDS = [re.compile(p.pattern.decode(), re.I) for p in WT_ENDS]
+LEGACY_T_RE = re.compile(T_RE.pattern.decode())
+
+SAMPLE = Path(__file__).resolve().parent.parent / "samples" / "input.gcode"
+
+
+class PassCounter(list):
+    """List that counts full iterations (slicing/indexing are not passes)."""
+
+    passes = 0
+
+    def __iter__(self):
+        self.passes += 1
+        return super().__iter__()
+
+
+def scaled_sample(scale: int) -> str:
+    text = SAMPLE.read_text(encoding="utf-8")
+    head, rest = text.split("; EXECUTABLE_BLOCK_START\n", 1)
+    body, tail = rest.split("; EXECUTABLE_BLOCK_END\n", 1)
+    return head + "; EXECUTABLE_BLOCK_START\n" + body * scale + "; EXECUTABLE_BLOCK_END\n" + tail
+
+
+def legacy_scan(lines):
+    """The four-loop scan cfs_postproc.main() used before the single-pass engine."""
+    flush_mult = matrix_nums = prime_volume = None
+    enable_prime_tower = 0
+    for ln in lines:
+        if flush_mult is None and (m := RE_FLUSH_MULT.match(ln)):
+            flush_mult = float(m.group(1))
+        if matrix_nums is None and (m := RE_FLUSH_MATRIX.match(ln)):
+            matrix_nums = parse_matrix(m.group(1))
+        if prime_volume is None and (m := RE_PRIME_VOLUME.match(ln)):
+            prime_volume = int(m.group(1))
+        if m := RE_ENABLE_PRIME_TOWER.match(ln):
+            enable_prime_tower = int(m.group(1))
+    wx = wy = None
+    for ln in lines:
+        if m := re.search(r";\s*wipe_tower_x\s*=\s*([0-9.-]+)", ln):
+            wx = float(m.group(1))
+        if m := re.search(r";\s*wipe_tower_y\s*=\s*([0-9.-]+)", ln):
+            wy = float(m.group(1))
+    in_scan = False
+    for ln in lines:
+        if any(p.search(ln) for p in LEGACY_WT_STARTS):
+            in_scan = True
+            continue
+        if in_scan and any(p.search(ln) for p in LEGACY_WT_ENDS):
+            in_scan = False
+            continue
+        if in_scan:
+            re.search(r"\bX(-?\d+\.?\d*)", ln)
+            re.search(r"\bY(-?\d+\.?\d*)", ln)
+    transitions = []
+    current = None
+    for i, ln in enumerate(lines):
+        if mt := LEGACY_T_RE.match(ln.strip()):
+            to = int(mt.group(1))
+            if current is not None and current != to:
+                transitions.append((i, current, to))
+            current = to
+    return flush_mult, matrix_nums, prime_volume, enable_prime_tower, wx, wy, transitions
+
+
+def run(name, fn, lines):
+    counted = PassCounter(lines)
+    t0 = time.perf_counter()
+    fn(counted)
+    dt = time.perf_counter() - t0
+    print(f"{name:<12} passes={counted.passes}  {dt:8.3f}s  {len(lines) / dt / 1e6:6.2f} Mlines/s")
+    return dt
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Legacy multi-pass vs single-pass scan")
+    ap.add_argument("--scale", type=int, default=100, help="EXECUTABLE_BLOCK repetitions")
+    args = ap.parse_args()
+
+    text = scaled_sample(args.scale)
+    lines = text.splitlines()
+    print(f"input: {len(text) / 1e6:.1f} MB, {len(lines)} lines (scale={args.scale})")
+    t_old = run("legacy", legacy_scan, lines)
+    t_new = run("single-pass", scan_lines, text.encode("utf-8").splitlines(keepends=True))
+    print(f"speedup: {t_old / t_new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+bench_sparse.py
+Lines/sec of the per-line scanner vs the mmap-backed sparse marker search.
+
+The EXECUTABLE_BLOCK of samples/input.gcode is repeated `--scale` times and
+written to a temporary file, which both engines then scan from disk.
+
+Usage:
+  PYTHONPATH=src python benchmarks/bench_sparse.py --scale 100
+"""
+
+from __future__ import annotations
+
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from bench_single_pass import scaled_sample
+
+from cfs_postproc.scan import scan_lines
+from cfs_postproc.sparse import scan_file
+from cfs_postproc.stream import iter_lines
+
+
+def run(name, fn, path, n_lines):
+    t0 = time.perf_counter()
+    res = fn(path)
+    dt = time.perf_counter() - t0
+    print(f"{name:<8} {dt:8.3f}s  {n_lines / dt / 1e6:7.2f} Mlines/s")
+    return dt, res
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Per-line scan vs mmap sparse marker search")
+    ap.add_argument("--scale", type=int, default=100, help="EXECUTABLE_BLOCK repetitions")
+    args = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "scaled.gcode"
+        path.write_text(scaled_sample(args.scale), encoding="utf-8")
+        res = scan_file(path)
+        print(f"input: {path.stat().st_size / 1e6:.1f} MB, {res.line_count} lines")
+        t_lines, a = run("lines", lambda p: scan_lines(iter_lines(p)), path, res.line_count)
+        t_mmap, b = run("sparse", scan_file, path, res.line_count)
+        assert a == b, "engines disagree"
+        print(f"speedup: {t_lines / t_mmap:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+bench_suite.py
+End-to-end throughput and peak memory on large synthetic jobs, with baselines.
+
+`run` writes synthetic jobs of each `--sizes` entry (10M, 100M, 1G, ...) in
+every variant below into `--fixtures` (kept for later runs), processes each
+one in a fresh interpreter through `process()` and records wall time, MB/s
+and the peak RSS of that interpreter (best of `--repeat`):
+
+- `dense`:  four tool changes per layer, each with a wipe tower section,
+- `sparse`: one tool change every 20 layers, wipe tower on every layer,
+- `notower`: one tool change every 5 layers, no wipe tower (park from the
+  slicer's `wipe_tower_x/y`).
+
+Peak RSS includes the pages of the memory-mapped input that were touched,
+so on the default (spliced) path it grows with the input size even though
+little of it is heap.
+
+Results are written as JSON (`--output`); a run on a reference machine is
+kept in `benchmarks/baselines/` as the baseline. `compare BASELINE RESULTS`
+matches cases by name and exits with status 1 if any case lost more than
+`--max-slowdown` of its MB/s or grew its peak RSS by more than
+`--max-rss-growth` (fractions, default 0.10 / 0.10).
+
+Usage:
+  PYTHONPATH=src python benchmarks/bench_suite.py run --sizes 10M,100M -o results.json
+  PYTHONPATH=src python benchmarks/bench_suite.py run --sizes 1G --engine-args="--stream"
+  python benchmarks/bench_suite.py compare benchmarks/baselines/reference.json results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import shlex
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+SUITE_VERSION = 1  # bump when the fixtures or the measured code path change
+UNITS = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+VARIANTS = {
+    # name: (tool changes per layer, or one every -n layers; wipe tower sections)
+    "dense": (4, True),
+    "sparse": (-20, True),
+    "notower": (-5, False),
+}
+
+CONFIG = b"".join(
+    [
+        b"; CONFIG_BLOCK_START\n",
+        b"; flush_multiplier = 0.6\n",
+        b"; flush_volumes_matrix = " + b",".join([b"0", b"350", b"420", b"510"] * 4) + b"\n",
+        b"; enable_prime_tower = 1\n",
+        b"; prime_volume = 30\n",
+        b"; CONFIG_BLOCK_END\n",
+    ]
+)
+PERIMETER = b"".join(
+    b"G1 X%d.%03d Y%d.%03d E0.04512\n" % (60 + i % 90, i * 7 % 1000, 60 + i * 3 % 90, i % 1000)
+    for i in range(120)
+)
+TOWER = b"".join(
+    [
+        b"; WIPE_TOWER_START\n",
+        b"G1 E-0.8 F2100\nG1 X170 Y180 F12000\nG1 E0.8 F2100\n",
+        *(b"G1 X%d.5 Y%d.25 E0.0312\n" % (170 + i % 20, 180 + i % 8) for i in range(40)),
+        b"; WIPE_TOWER_END\n",
+    ]
+)
+
+
+def parse_size(text: str) -> int:
+    text = text.strip().upper()
+    return int(float(text[:-1]) * UNITS[text[-1]]) if text[-1] in UNITS else int(text)
+
+
+def case_name(size: int, variant: str) -> str:
+    for unit in "GMK":
+        if size % UNITS[unit] == 0:
+            return f"{size // UNITS[unit]}{unit}-{variant}"
+    return f"{size}-{variant}"
+
+
+def write_job(path: Path, size: int, variant: str):
+    """Write a synthetic job of about `size` bytes (a whole number of layers)."""
+    changes, tower = VARIANTS[variant]
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(b"; HEADER_BLOCK_START\n; generated by bench_suite.py\n; HEADER_BLOCK_END\n")
+        f.write(b"; EXECUTABLE_BLOCK_START\nT0\n")
+        if not tower:
+            f.write(b"; wipe_tower_x = 175\n; wipe_tower_y = 184\n")
+        written = f.tell() + len(CONFIG)
+        layer = tool = 0
+        while written < size:
+            z = 0.2 * (layer + 1)
+            parts = [b";LAYER_CHANGE\n;Z:%.2f\nG1 Z%.2f F600\n;TYPE:Outer wall\n" % (z, z)]
+            n = changes if changes > 0 else int(layer % -changes == 0)
+            for _ in range(max(n, 1)):
+                parts.append(PERIMETER)
+                if tower:
+                    parts.append(TOWER)
+                if n:
+                    tool = (tool + 1) % 4
+                    parts.append(b"T%d\n" % tool)
+            block = b"".join(parts)
+            f.write(block)
+            written += len(block)
+            layer += 1
+        f.write(b"; EXECUTABLE_BLOCK_END\n")
+        f.write(CONFIG)
+    tmp.replace(path)
+
+
+def fixture(root: Path, size: int, variant: str) -> Path:
+    path = root / f"{case_name(size, variant)}.v{SUITE_VERSION}.gcode"
+    if not path.exists():
+        print(f"writing {path} ...", file=sys.stderr)
+        write_job(path, size, variant)
+    return path
+
+
+def measure_one(infile: str, outfile: str, engine_args: str):
+    """Body of the `_case` child: process once and print wall time and peak RSS as JSON."""
+    import resource
+    import time
+
+    from cfs_postproc.cfs_postproc import Options, parse_args, process
+
+    opts = Options.from_args(parse_args([infile, outfile, *shlex.split(engine_args)]))
+    t0 = time.perf_counter()
+    report = process(infile, outfile, opts)
+    seconds = time.perf_counter() - t0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss *= 1 if sys.platform == "darwin" else 1024  # bytes on macOS, KiB elsewhere
+    print(json.dumps({"seconds": seconds, "peak_rss": rss, "output_bytes": report.output_bytes}))
+
+
+def run_case(infile: Path, outdir: Path, engine_args: str, repeat: int) -> dict:
+    """Best wall time and lowest peak RSS of `repeat` fresh-interpreter runs."""
+    outfile = outdir / "out.gcode"
+    cmd = [sys.executable, __file__, "_case", str(infile), str(outfile), engine_args]
+    runs = [
+        json.loads(subprocess.run(cmd, check=True, capture_output=True).stdout)
+        for _ in range(repeat)
+    ]
+    outfile.unlink(missing_ok=True)
+    size = infile.stat().st_size
+    seconds = min(r["seconds"] for r in runs)
+    return {
+        "input_bytes": size,
+        "output_bytes": runs[0]["output_bytes"],
+        "seconds": seconds,
+        "mb_per_s": size / seconds / 1e6,
+        "peak_rss": min(r["peak_rss"] for r in runs),
+    }
+
+
+def cmd_run(opts):
+    root = Path(opts.fixtures)
+    root.mkdir(parents=True, exist_ok=True)
+    results = {
+        "suite_version": SUITE_VERSION,
+        "engine_args": opts.engine_args,
+        "machine": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+        },
+        "cases": {},
+    }
+    print(f"{'case':<16} {'MB':>8} {'seconds':>9} {'MB/s':>9} {'peak RSS MB':>12}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in map(parse_size, opts.sizes.split(",")):
+            for variant in opts.variants.split(","):
+                name = case_name(size, variant)
+                r = run_case(fixture(root, size, variant), Path(tmp), opts.engine_args, opts.repeat)
+                results["cases"][name] = r
+                print(
+                    f"{name:<16} {r['input_bytes'] / 1e6:8.1f} {r['seconds']:9.3f} "
+                    f"{r['mb_per_s']:9.1f} {r['peak_rss'] / 1e6:12.1f}"
+                )
+    if opts.output:
+        Path(opts.output).write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+
+
+def compare(baseline: dict, current: dict, max_slowdown: float, max_rss_growth: float):
+    """(report lines, regressed) for the cases present in both result documents."""
+    lines = []
+    regressed = False
+    if baseline.get("engine_args") != current.get("engine_args"):
+        lines.append(
+            f"warning: engine args differ ({baseline.get('engine_args')!r} vs "
+            f"{current.get('engine_args')!r})"
+        )
+    for name, base in baseline["cases"].items():
+        cur = current["cases"].get(name)
+        if cur is None:
+            continue
+        speed = cur["mb_per_s"] / base["mb_per_s"] - 1
+        rss = cur["peak_rss"] / base["peak_rss"] - 1
+        bad = []
+        if speed < -max_slowdown:
+            bad.append("MB/s")
+        if rss > max_rss_growth:
+            bad.append("RSS")
+        regressed = regressed or bool(bad)
+        lines.append(
+            f"{name:<16} {base['mb_per_s']:8.1f} -> {cur['mb_per_s']:8.1f} MB/s ({speed:+6.1%})  "
+            f"{base['peak_rss'] / 1e6:8.1f} -> {cur['peak_rss'] / 1e6:8.1f} MB RSS ({rss:+6.1%})"
+            + (f"  REGRESSED: {', '.join(bad)}" if bad else "")
+        )
+    if not any(name in current["cases"] for name in baseline["cases"]):
+        lines.append("no common cases")
+    return lines, regressed
+
+
+def cmd_compare(opts):
+    docs = [json.loads(Path(p).read_text(encoding="utf-8")) for p in (opts.baseline, opts.results)]
+    if docs[0].get("suite_version") != docs[1].get("suite_version"):
+        sys.exit("suite versions differ; record a new baseline")
+    lines, regressed = compare(*docs, opts.max_slowdown, opts.max_rss_growth)
+    print("\n".join(lines))
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] == ["_case"]:
+        return measure_one(*argv[1:])
+    ap = argparse.ArgumentParser(description="Large-file throughput / peak memory suite")
+    sub = ap.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Measure every case and optionally save the results")
+    run.add_argument("--sizes", default="10M,100M", help="Comma-separated sizes (K/M/G suffixes)")
+    run.add_argument("--variants", default=",".join(VARIANTS), help="Comma-separated variants")
+    run.add_argument(
+        "--fixtures",
+        default=str(Path(tempfile.gettempdir()) / "cfs_postproc_bench"),
+        help="Directory the synthetic jobs are written to and reused from",
+    )
+    run.add_argument("--engine-args", default="", help="Extra cfs-postproc flags, e.g. --stream")
+    run.add_argument("--repeat", type=int, default=3, help="Runs per case (best is kept)")
+    run.add_argument("-o", "--output", help="Write the results as JSON to this path")
+    cmp = sub.add_parser("compare", help="Fail if results regress against a baseline")
+    cmp.add_argument("baseline")
+    cmp.add_argument("results")
+    cmp.add_argument("--max-slowdown", type=float, default=0.10, help="Allowed MB/s loss")
+    cmp.add_argument("--max-rss-growth", type=float, default=0.10, help="Allowed RSS growth")
+    opts = ap.parse_args(argv)
+    return cmd_run(opts) if opts.command == "run" else cmd_compare(opts)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
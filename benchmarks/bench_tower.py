@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+bench_tower.py
+Tower X/Y extraction: per-line search vs bulk findall, with and without NumPy.
+
+A synthetic wipe tower body of `--moves` extrusion moves (each followed by a
+retract, as on fine-layer jobs) is reduced to its bounding box three ways:
+`LineScanner.feed()` searching every line, `block_extents()` with float()
+conversion, and `block_extents()` converting through NumPy (skipped if NumPy
+is not installed). All must give the same box. The regex pass dominates
+those totals, so the conversion + reduction step is also timed on its own
+(`convert`), once through Python lists and once through NumPy.
+
+Usage:
+  PYTHONPATH=src python benchmarks/bench_tower.py --moves 500000
+"""
+
+from __future__ import annotations
+
+import argparse
+import time
+
+from cfs_postproc import scan
+from cfs_postproc.scan import LineScanner, block_extents
+
+
+def tower_body(moves: int) -> bytes:
+    return b"".join(
+        b"G1 X%d.%d Y%d.25 E0.0312\nG1 E-0.8 F2100\n" % (100 + i % 20, i % 10, 100 + i % 30)
+        for i in range(moves)
+    )
+
+
+def per_line(data: bytes):
+    s = LineScanner(in_tower=True).feed(data.splitlines(keepends=True))
+    return s.minx, s.miny, s.maxx, s.maxy
+
+
+def run(name, fn, data, n_moves):
+    t0 = time.perf_counter()
+    res = fn(data)
+    dt = time.perf_counter() - t0
+    print(f"{name:<10} {dt:8.3f}s  {n_moves / dt / 1e6:7.2f} Mmoves/s")
+    return dt, res
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Tower X/Y extraction benchmark")
+    ap.add_argument("--moves", type=int, default=500_000, help="Tower extrusion moves")
+    args = ap.parse_args()
+
+    data = tower_body(args.moves)
+    print(f"input: {len(data) / 1e6:.1f} MB, {args.moves} moves")
+    t_line, a = run("per-line", per_line, data, args.moves)
+    t_bulk, b = run("findall", lambda d: block_extents(d, use_numpy=False), data, args.moves)
+    assert a == b, "per-line and bulk disagree"
+    print(f"speedup: {t_line / t_bulk:.2f}x")
+    if scan._get_numpy():
+        t_np, c = run("numpy", lambda d: block_extents(d, use_numpy=True), data, args.moves)
+        assert a == c, "per-line and numpy disagree"
+        print(f"speedup: {t_line / t_np:.2f}x")
+    else:
+        print("numpy      not installed, skipped")
+
+    xs = scan.RE_X_LINES.findall(data)
+    t_py, d = run("convert", lambda v: scan._min_max(v, False), xs, args.moves)
+    if scan._get_numpy():
+        t_npc, e = run("convert-np", lambda v: scan._min_max(v, True), xs, args.moves)
+        assert d == e, "python and numpy conversion disagree"
+        print(f"speedup: {t_py / t_npc:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
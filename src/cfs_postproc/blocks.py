@@ -0,0 +1,177 @@
+"""
+blocks.py
+Block-structure index for Creality Print G-code.
+
+Creality files are split into `; HEADER_BLOCK_START/END`, repeated
+`; THUMBNAIL_BLOCK_START/END` (base64 previews), `; EXECUTABLE_BLOCK_START/END`
+and `; CONFIG_BLOCK_START/END`. `index_blocks()` records the byte range of each
+block with one C-level regex pass over the raw bytes, and `regions()` turns
+that into a partition of the whole file (text between blocks gets name "").
+
+Region boundaries always fall just after a "\\n", so decoding and splitting
+each region separately yields exactly the lines of the whole file. Stages use
+that to skip regions they do not need, e.g. thumbnails are never scanned.
+"""
+
+from __future__ import annotations
+
+import re
+from collections import namedtuple
+
+RE_BLOCK_MARKER = re.compile(rb"^[ \t]*;[ \t]*([A-Z]+)_BLOCK_(START|END)[ \t]*\r?$", re.M)
+# "\n" before a `;LAYER_CHANGE` line (the slicer's per-layer marker)
+RE_LAYER_CHANGE = re.compile(rb"\n[ \t]*;[ \t]*LAYER_CHANGE\b")
+
+INDEX_CHUNK = 1 << 20
+TAIL_CHUNK = 64 * 1024
+# Trailing bytes searched backwards for a block before falling back to a forward scan
+MAX_TAIL = 8 * 1024 * 1024
+
+THUMBNAIL = "THUMBNAIL"
+
+
+# name: HEADER, THUMBNAIL, EXECUTABLE, CONFIG; "" for text between blocks
+# start: offset of the START marker line
+# end: offset just past the END marker line (terminator included)
+Block = namedtuple("Block", "name start end")
+
+
+def _markers(data: bytes, base: int = 0):
+    for m in RE_BLOCK_MARKER.finditer(data):
+        nl = data.find(b"\n", m.end())
+        end = len(data) if nl < 0 else nl + 1
+        yield m.group(1).decode("ascii"), m.group(2) == b"START", base + m.start(), base + end
+
+
+def _pair(markers):
+    blocks = []
+    open_name = open_start = None
+    for name, is_start, start, end in markers:
+        if is_start:
+            open_name, open_start = name, start
+        elif name == open_name:
+            blocks.append(Block(name, open_start, end))
+            open_name = open_start = None
+    return blocks
+
+
+def _tail_markers(read, size: int, until, floor: int = 0, max_tail: int = MAX_TAIL):
+    """Markers of the file's tail, read backwards from EOF in TAIL_CHUNK steps.
+
+    Stops as soon as `until(markers)` holds for the markers found so far (in
+    file order), or at `floor` (a line start), below which nothing is read.
+    Returns the markers, or None if neither happened within `max_tail` bytes.
+    """
+    found = []
+    pos = size
+    carry = b""  # partial first line of what was read so far, not yet searched
+    while pos > floor:
+        if size - pos >= max_tail:
+            return None
+        step = min(TAIL_CHUNK, pos - floor)
+        pos -= step
+        data = read(pos, pos + step) + carry
+        nl = data.find(b"\n") if pos > floor else -1
+        if pos > floor and nl < 0:
+            carry = data
+            continue
+        carry = data[: nl + 1]
+        found[:0] = _markers(data[nl + 1 :], pos + nl + 1)
+        if until(found):
+            return found
+    return found
+
+
+def _index(read, size: int, chunk_size: int, max_tail: int):
+    """Find block markers reading forward only up to EXECUTABLE_BLOCK_START.
+
+    HEADER and THUMBNAIL blocks precede the executable body and CONFIG_BLOCK
+    follows it, so the markers after the body are searched backwards from EOF
+    (at most `max_tail` bytes) until the body's END marker. Only if it is not
+    there is the rest of the file scanned forward.
+    """
+    found = []
+    pos = 0
+    tail = b""
+    tried_tail = False
+    while pos < size:
+        end = min(size, pos + chunk_size)
+        buf = tail + read(pos, end)
+        base = pos - len(tail)
+        cut = buf.rfind(b"\n") + 1 if end < size else len(buf)
+        found.extend(_markers(buf[:cut], base))
+        tail = buf[cut:]
+        pos = end
+        if tried_tail or pos >= size:
+            continue
+        if any(n == "EXECUTABLE" and st for n, st, _, _ in found):
+            tried_tail = True
+            after = _tail_markers(
+                read,
+                size,
+                lambda ms: any(n == "EXECUTABLE" and not st for n, st, _, _ in ms),
+                floor=pos - len(tail),
+                max_tail=max_tail,
+            )
+            if after is not None:
+                return found + after
+    return found
+
+
+def index_blocks(data: bytes, max_tail: int = MAX_TAIL):
+    """Marker-delimited blocks of an in-memory file, in file order."""
+    return _pair(_index(lambda a, b: data[a:b], len(data), INDEX_CHUNK, max_tail))
+
+
+def _file_reader(f):
+    def read(a, b):
+        f.seek(a)
+        return f.read(b - a)
+
+    return read
+
+
+def index_file(path, chunk_size: int = INDEX_CHUNK, max_tail: int = MAX_TAIL):
+    """Like index_blocks(), reading only the head and tail of `path` when possible."""
+    with open(path, "rb") as f:
+        return _pair(_index(_file_reader(f), f.seek(0, 2), chunk_size, max_tail))
+
+
+def find_tail_block(path, name: str, max_tail: int = MAX_TAIL):
+    """The last `name` block of `path`, searched backwards from EOF only; None if absent.
+
+    Meant for blocks at the end of the file (CONFIG): reads just the tail up to
+    the block's START marker, and gives up after `max_tail` bytes.
+    """
+
+    def until(markers):
+        return any(b.name == name for b in _pair(markers))
+
+    with open(path, "rb") as f:
+        markers = _tail_markers(_file_reader(f), f.seek(0, 2), until, max_tail=max_tail)
+    blocks = [b for b in _pair(markers or ()) if b.name == name]
+    return blocks[-1] if blocks else None
+
+
+def layer_offsets(buf, start: int = 0, end: int | None = None):
+    """Offsets of the `;LAYER_CHANGE` lines in buf[start:end] (start must be a line start)."""
+    end = len(buf) if end is None else end
+    out = []
+    if start < end and RE_LAYER_CHANGE.match(b"\n" + bytes(buf[start : start + 256])):
+        out.append(start)
+    out.extend(m.start() + 1 for m in RE_LAYER_CHANGE.finditer(buf, start, end))
+    return out
+
+
+def regions(blocks, size: int):
+    """Partition [0, size) into the given blocks plus unnamed gaps between them."""
+    out = []
+    pos = 0
+    for b in blocks:
+        if b.start > pos:
+            out.append(Block("", pos, b.start))
+        out.append(b)
+        pos = b.end
+    if pos < size or not out:
+        out.append(Block("", pos, size))
+    return out
@@ -0,0 +1,153 @@
+"""
+cache.py
+Content-addressed on-disk cache of processed outputs.
+
+An entry is keyed by the SHA-256 of the input bytes plus the options
+fingerprint (every option that changes the output) and whether the header
+timestamp is pinned. On a hit the cached output is reflinked, hard-linked or,
+as a last resort, copied to the requested path, so re-exported plates are not
+rescanned. Entries are evicted least-recently-used first once the cache grows
+past its size limit; a hit refreshes the entry's mtime. Next to each output
+the entry keeps its plan summary (`<key>.json`, the `--report-json` facts),
+so a hit reports the same fields as the run that stored it.
+
+Every writer in this package replaces its output by renaming a temporary file,
+so an output hard-linked to an entry is never modified in place.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import mmap
+import os
+from pathlib import Path
+
+DEFAULT_MAX_BYTES = 1 << 30
+HASH_CHUNK = 1 << 20
+FICLONE = 0x40049409  # Linux ioctl: share all extents of another file (reflink)
+
+
+def digest_file(path) -> str:
+    """SHA-256 of `path`, hashed straight from a read-only mapping.
+
+    Hashing is what first reads the file; a scan that follows on a cache miss
+    finds its pages already cached.
+    """
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+                view = memoryview(m)
+                try:
+                    for a in range(0, len(view), HASH_CHUNK):
+                        h.update(view[a : a + HASH_CHUNK])
+                finally:
+                    view.release()
+    return h.hexdigest()
+
+
+def _reflink(src: Path, dst: Path):
+    import fcntl
+
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+
+
+def link_or_copy(src: Path, dst: Path):
+    """Atomically make `dst` a reflink, hard link or copy of `src` (first that works)."""
+    try:
+        if os.path.samefile(src, dst):
+            return  # already a hard link; renaming onto it would be a no-op
+    except OSError:
+        pass
+    tmp = dst.with_name(dst.name + ".tmp")
+    tmp.unlink(missing_ok=True)
+    try:
+        _reflink(src, tmp)
+    except (ImportError, OSError):
+        tmp.unlink(missing_ok=True)
+        try:
+            os.link(src, tmp)
+        except OSError:
+            import shutil
+
+            shutil.copyfile(src, tmp)
+    tmp.replace(dst)
+
+
+def read_header(path):
+    """Header lines of an output file (everything before the first empty line)."""
+    hdr = []
+    with open(path, "rb") as f:
+        for line in f:
+            line = line.rstrip(b"\r\n")
+            if not line:
+                break
+            hdr.append(line.decode("utf-8", errors="replace"))
+    return hdr
+
+
+class ResultCache:
+    def __init__(self, root, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(input_digest: str, fingerprint: str, epoch: int | None) -> str:
+        """Entry key; `epoch` is the pinned header time (header_epoch()), None if unpinned."""
+        raw = f"{input_digest}:{fingerprint}:{'-' if epoch is None else epoch}"
+        return hashlib.sha256(raw.encode("ascii")).hexdigest()
+
+    def entry(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.gcode"
+
+    def plan_path(self, key: str) -> Path:
+        return self.root / key[:2] / f"{key}.json"
+
+    def fetch(self, key: str, dst: Path):
+        """Materialize the entry for `key` at `dst` and return its plan summary; None on a miss.
+
+        An entry without a readable summary counts as a miss.
+        """
+        import json  # imported on use: runs without --cache-dir skip it
+
+        src = self.entry(key)
+        try:
+            with open(self.plan_path(key), encoding="utf-8") as f:
+                plan = json.load(f)
+            os.utime(src)  # LRU: a hit makes the entry the most recently used
+        except (OSError, ValueError):
+            return None
+        link_or_copy(src, Path(dst))
+        return plan
+
+    def store(self, key: str, output: Path, plan: dict):
+        """Add a finished output and its plan summary under `key`, then evict down to `max_bytes`."""
+        import json
+
+        dst = self.entry(key)
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        link_or_copy(Path(output), dst)
+        meta = self.plan_path(key)
+        tmp = meta.with_name(meta.name + ".tmp")
+        tmp.write_text(json.dumps(plan), encoding="utf-8")
+        tmp.replace(meta)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for p in self.root.glob("??/*.gcode"):
+            try:
+                st = p.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, p))
+            total += st.st_size
+        entries.sort()
+        for _, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            p.with_suffix(".json").unlink(missing_ok=True)
+            total -= size
@@ -2,7 +2,7 @@
 """
 cfs_postproc.py
 - If present: read `; flush_multiplier = ...` and `; flush_volumes_matrix = ...`,
-  scale the 16 matrix values (round to int), and rewrite the matrix line.
+  scale the N×N matrix values (round to int), and rewrite the matrix line.
 - Always: inject safe pre-cut retracts around real tool changes (from != to).
 - Never: inject CFS_PURGE, never remove tower.
 
@@ -16,50 +16,122 @@ Additional safety:
   The actual applied multiplier is recorded in the header comments.
 
 Assumptions:
-- 4 tools (T0..T3) → 4×4 matrix (16 integers).
+- N tools (T0..T<N-1>, up to T15 for four CFS units) → N×N matrix (N² integers);
+  N is taken from the matrix length (or the `filament_colour` count).
 - Filament Ø 1.75 mm is irrelevant here; we do not convert mm³.
 
+Park point:
+- Without an override or slicer `wipe_tower_x/y`, each transition parks over
+  the center of the tower on its own layer (or the nearest layer below with a
+  tower). `--tower-stable-layers K` stops measuring the tower once K layers in
+  a row had the same footprint, which skips most tower moves on tall prints.
+
 Console markers:
 - Pass `--m118-sentinels` to emit M118 markers for transitions, parking, and pre-cut.
 
-Usage:
-  python3 cfs_postproc.py input.gcode output.gcode --m118-sentinels --console-summary
+Line endings:
+- Lines are processed as raw bytes; nothing is decoded. Untouched lines keep
+  their exact bytes and terminators ("\\n", "\\r\\n" or "\\r"), and injected
+  lines use the terminator of the line they replace.
+
+Large files:
+- Pass `--stream` to read and write incrementally (two streaming passes, memory
+  bounded by `--buffer-size`); the output is byte-identical to the default path.
+- Pass `--jobs N` to split the executable block at `;LAYER_CHANGE` lines and
+  process the chunks in N worker processes; the output is again identical.
+- Pass `--index` to keep the scan in an `<input>.idx` sidecar; re-running on
+  the same input with other injection options then only splices.
+
+Usage (after `pip install .`; the engine spans several modules of this package):
+  cfs-postproc input.gcode output.gcode --m118-sentinels --console-summary
+  python3 -m cfs_postproc input.gcode output.gcode ...
+
+Library use:
+  report = process("in.gcode", "out.gcode", Options(m118_sentinels=True))
+  `process()` keeps no state between calls, so it can run concurrently in
+  threads or pool workers; `report.header` holds the header lines and
+  `report.as_dict()` the same facts, sizes and stage timings as JSON types
+  (what `--report-json PATH` writes).
 """
 
 from __future__ import annotations
 
-import argparse
-import re
+import hashlib
+import mmap
+import os
 import sys
-from datetime import datetime
+import time
+from array import array
+from bisect import bisect_right
+from collections import namedtuple
+from itertools import chain
 from pathlib import Path
+from types import SimpleNamespace
+
+if __package__ in (None, ""):
+    # Executed as a plain script from a source checkout: put the package root
+    # on sys.path so the engine modules resolve. A copy of this file on its own
+    # cannot work; install the package instead.
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cfs_postproc.blocks import THUMBNAIL, index_blocks, index_file, regions
+from cfs_postproc.cache import (
+    DEFAULT_MAX_BYTES,
+    ResultCache,
+    digest_file,
+    read_header,
+)
+from cfs_postproc.scan import (  # noqa: F401  (re-exported engine API)
+    T_RE,
+    LineScanner,
+    ScanResult,
+    find_tower_center,
+    parse_matrix,
+    scan_lines,
+)
+from cfs_postproc.sidecar import load_index, save_index
+from cfs_postproc.sparse import plain_line_breaks, sparse_scan
+from cfs_postproc.splice import splice_file
+from cfs_postproc.stages import (
+    PROFILE_SUFFIX,
+    StageTimer,
+    format_stages,
+    profile_modes,
+)
+from cfs_postproc.stream import (
+    DEFAULT_BUFFER_SIZE,
+    iter_line_batches,
+    write_batches,
+)
 
-# ---------- Regexes ----------
-RE_FLUSH_MULT = re.compile(r"^\s*;\s*flush_multiplier\s*=\s*([0-9]*\.?[0-9]+)\s*$", re.I)
-RE_FLUSH_MATRIX = re.compile(r"^\s*;\s*flush_volumes_matrix\s*=\s*([0-9,\s]+)\s*$", re.I)
-RE_PRIME_VOLUME = re.compile(r"^\s*;\s*prime_volume\s*=\s*([0-9]+)\s*$", re.I)
-RE_ENABLE_PRIME_TOWER = re.compile(r"^\s*;\s*enable_prime_tower\s*=\s*([01])\s*$", re.I)
-
-WT_STARTS = [
-    re.compile(p, re.I)
-    for p in (
-        r"^\s*;+\s*WIPE_TOWER_START\b",
-        r"^\s*;+\s*PRIME_TOWER_START\b",
-        r"^\s*;+\s*CP\s+WIPE_TOWER\s*START\b",
-        r"^\s*;+\s*TYPE:\s*WIPE\s*TOWER\b",
-    )
-]
-WT_ENDS = [
-    re.compile(p, re.I)
-    for p in (
-        r"^\s*;+\s*WIPE_TOWER_END\b",
-        r"^\s*;+\s*PRIME_TOWER_END\b",
-        r"^\s*;+\s*CP\s+WIPE_TOWER\s*END\b",
-        r"^\s*;+\s*END\s*WIPE\s*TOWER\b",
-    )
-]
 
-T_RE = re.compile(r"^\s*T([0-3])\s*(?:;.*)?$")
+def __getattr__(name):
+    # RE_SETTING / WT_STARTS / WT_ENDS used to be importable from here; scan.py
+    # now compiles them on first access
+    if name in ("RE_SETTING", "WT_STARTS", "WT_ENDS"):
+        from cfs_postproc import scan
+
+        return getattr(scan, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+EOL_PROBE = 1 << 16  # bytes read to pick the header line terminator
+
+# Options that change the output; their values make up the options fingerprint
+OUTPUT_OPTIONS = (
+    "precut_mm",
+    "precut_f",
+    "zhop_mm",
+    "zhop_f",
+    "travel_f",
+    "precut_park_xy",
+    "m118_sentinels",
+    "tower_stable_layers",
+)
+FINGERPRINT_VERSION = 4  # bump when the output format changes for the same options
+FINGERPRINT_PREFIX = "; options fingerprint: "
+REPORT_VERSION = 1  # of the `--report-json` document; bump on incompatible changes
+ISO_SECONDS = "%Y-%m-%dT%H:%M:%S"  # datetime.isoformat(timespec="seconds"), without datetime
 
 
 def atomic_write_text(path: Path, text: str, encoding="utf-8"):
@@ -68,217 +140,234 @@ def atomic_write_text(path: Path, text: str, encoding="utf-8"):
     tmp.replace(path)
 
 
-def parse_matrix_16(payload: str):
-    nums = [n for n in payload.replace(" ", "").split(",") if n != ""]
-    if len(nums) != 16:
-        return None
-    try:
-        return [int(x) for x in nums]
-    except ValueError:
-        return None
+def split_eol(line: bytes):
+    """(body, terminator) of a byte line; the terminator may be b""."""
+    body = line.rstrip(b"\r\n")
+    return body, line[len(body) :]
 
 
-def find_tower_center(lines):
-    in_scan = False
-    minx = miny = float("inf")
-    maxx = maxy = float("-inf")
-    for ln in lines:
-        if any(p.search(ln) for p in WT_STARTS):
-            in_scan = True
-            continue
-        if in_scan and any(p.search(ln) for p in WT_ENDS):
-            in_scan = False
-            continue
-        if in_scan:
-            mx = re.search(r"\bX(-?\d+\.?\d*)", ln)
-            my = re.search(r"\bY(-?\d+\.?\d*)", ln)
-            if mx:
-                x = float(mx.group(1))
-                minx = min(minx, x)
-                maxx = max(maxx, x)
-            if my:
-                y = float(my.group(1))
-                miny = min(miny, y)
-                maxy = max(maxy, y)
-    if minx == float("inf") or miny == float("inf"):
-        return None
-    return ((minx + maxx) / 2.0, (miny + maxy) / 2.0)
+def detect_eol(buf) -> bytes:
+    """Terminator of the first line in `buf` ("\\r\\n" or "\\n"), used for added lines."""
+    nl = buf.find(b"\n")
+    return b"\r\n" if nl > 0 and buf[nl - 1 : nl] == b"\r" else b"\n"
 
 
-def main():
-    ap = argparse.ArgumentParser(
-        description="Rewrite flush_volumes_matrix by applying in-file flush_multiplier; inject safe pre-cut retracts."
-    )
-    ap.add_argument("infile", type=str, help="Input G-code")
-    ap.add_argument("outfile", type=str, help="Output G-code")
-    ap.add_argument("--precut-mm", type=float, default=80.0, help="Pre-cut retract amount (mm)")
-    ap.add_argument("--precut-f", type=int, default=600, help="Pre-cut retract feedrate")
-    ap.add_argument("--zhop-mm", type=float, default=0.6, help="Depart Z-hop before moving to park")
-    ap.add_argument("--zhop-f", type=int, default=3000, help="Feedrate for depart Z-hop")
-    ap.add_argument("--travel-f", type=int, default=18000, help="Feedrate for XY travel to park")
-    ap.add_argument(
-        "--precut-park-xy",
-        type=str,
-        default=None,
-        help='Override park "X,Y" (else autodetect tower center)',
-    )
-    ap.add_argument(
-        "--m118-sentinels",
-        action="store_true",
-        help="Print M118 start/end markers around transitions and pre-cuts",
-    )
-    ap.add_argument("--console-summary", action="store_true", help="Print header summary to stderr")
-    args = ap.parse_args()
-
-    text = Path(args.infile).read_text(encoding="utf-8", errors="ignore")
-    lines = text.splitlines()
-
-    flush_mult = None
-    flush_mult_idx = None
-    matrix_line_idx = None
-    matrix_nums = None
-    prime_volume = None
-    enable_prime_tower = 0  # Default to 0 (disabled)
-
-    for i, ln in enumerate(lines):
-        if flush_mult is None:
-            m = RE_FLUSH_MULT.match(ln)
-            if m:
-                try:
-                    flush_mult = float(m.group(1))
-                except ValueError:
-                    flush_mult = None
-                flush_mult_idx = i
-        if matrix_line_idx is None:
-            mm = RE_FLUSH_MATRIX.match(ln)
-            if mm:
-                parsed = parse_matrix_16(mm.group(1))
-                if parsed:
-                    matrix_line_idx = i
-                    matrix_nums = parsed
-        if prime_volume is None:
-            pv = RE_PRIME_VOLUME.match(ln)
-            if pv:
-                try:
-                    prime_volume = int(pv.group(1))
-                except ValueError:
-                    prime_volume = None
-
-        # Check for enable_prime_tower setting
-        ep = RE_ENABLE_PRIME_TOWER.match(ln)
-        if ep:
-            try:
-                enable_prime_tower = int(ep.group(1))
-            except ValueError:
-                enable_prime_tower = 0
-
-    park_xy = None
-    if args.precut_park_xy:
+def _parse_xy(override: str | None):
+    if override:
         try:
-            xs, ys = args.precut_park_xy.split(",")
-            park_xy = (float(xs), float(ys))
+            xs, ys = override.split(",")
+            return (float(xs), float(ys))
         except Exception:
-            park_xy = None
-    wipe_tower_x = None
-    wipe_tower_y = None
-    for line in lines:
-        match_x = re.search(r";\s*wipe_tower_x\s*=\s*([0-9.-]+)", line)
-        match_y = re.search(r";\s*wipe_tower_y\s*=\s*([0-9.-]+)", line)
-        if match_x:
-            wipe_tower_x = float(match_x.group(1))
-        if match_y:
-            wipe_tower_y = float(match_y.group(1))
-    if park_xy is None:
-        if wipe_tower_x is not None and wipe_tower_y is not None:
-            park_xy = (wipe_tower_x, wipe_tower_y)
-        else:
-            auto_center = find_tower_center(lines)
-            if auto_center:
-                park_xy = auto_center
-    orig_matrix = matrix_nums[:] if matrix_nums else None
-    scaled_matrix = None
-    matrix_rewritten = False
-    applied_mult = None
-
-    if (matrix_nums is not None) and (flush_mult is not None):
-        applied_mult = flush_mult
-        scaled_matrix = [max(0, int(round(v * applied_mult))) for v in matrix_nums]
-
-        # If prime tower is enabled and prime_volume is found, subtract it from scaled matrix values
-        if enable_prime_tower == 1 and prime_volume is not None and prime_volume > 0:
-            # Subtract prime_volume from each value, but never go below 50 and skip zeros
-            final_matrix = []
-            for v in scaled_matrix:
-                if v == 0:
-                    final_matrix.append(0)
-                else:
-                    subtracted = v - prime_volume
-                    final_matrix.append(max(50, subtracted))
-            scaled_matrix = final_matrix
-        new_payload = ", ".join(str(v) for v in scaled_matrix)
-        lines[matrix_line_idx] = f"; flush_volumes_matrix = {new_payload}"
-        matrix_rewritten = True
+            pass
+    return None
+
+
+def park_source(scan: ScanResult, override: str | None):
+    """Where the park point comes from: "override", "slicer", "tower" or None (no park)."""
+    if _parse_xy(override) is not None:
+        return "override"
+    if scan.wipe_tower_x is not None and scan.wipe_tower_y is not None:
+        return "slicer"
+    return "tower" if scan.tower_center is not None else None
+
+
+def resolve_park_xy(scan: ScanResult, override: str | None):
+    """Park point: explicit "X,Y" override, else slicer wipe_tower_x/y, else tower center."""
+    source = park_source(scan, override)
+    if source == "override":
+        return _parse_xy(override)
+    if source == "slicer":
+        return (scan.wipe_tower_x, scan.wipe_tower_y)
+    return scan.tower_center
+
+
+def transition_parks(scan: ScanResult, override: str | None, park_xy):
+    """Park point of every transition in `scan.transitions`.
+
+    When the park point is autodetected from the tower, each transition parks
+    over the tower of its own layer, or of the nearest layer below that has
+    one, so a tower that shrinks or stops on upper layers is still hit.
+    Otherwise (and before the first tower layer) every transition uses `park_xy`.
+    """
+    if park_source(scan, override) != "tower" or not scan.tower_layers:
+        return [park_xy] * len(scan.transitions)
+    layers = sorted(scan.tower_layers)
+    centers = []
+    for n in layers:
+        minx, miny, maxx, maxy = scan.tower_layers[n]
+        centers.append(((minx + maxx) / 2.0, (miny + maxy) / 2.0))
+    parks = []
+    for idx, _, _ in scan.transitions:
+        k = bisect_right(layers, bisect_right(scan.layer_lines, idx) - 1) - 1
+        parks.append(centers[k] if k >= 0 else park_xy)
+    return parks
 
-    # Force output multiplier to 1.0 if present
-    if flush_mult_idx is not None:
-        lines[flush_mult_idx] = "; flush_multiplier = 1.0"
 
+def scale_matrix(scan: ScanResult):
+    """Apply flush_multiplier (and prime_volume subtraction) to the matrix, or None.
+
+    Both steps run in one pass over the whole matrix into a new array("l").
+    """
+    if scan.matrix_nums is None or scan.flush_mult is None:
+        return None
+    mult = scan.flush_mult
+    # If prime tower is enabled and prime_volume is found, subtract it from scaled matrix values,
+    # but never go below 50 and skip zeros
+    pv = scan.prime_volume
+    if scan.enable_prime_tower == 1 and pv is not None and pv > 0:
+        return array(
+            "l",
+            [
+                0 if s <= 0 else max(50, s - pv)
+                for s in (int(round(v * mult)) for v in scan.matrix_nums)
+            ],
+        )
+    return array("l", [max(0, int(round(v * mult))) for v in scan.matrix_nums])
+
+
+def park_lines(park_xy, args):
+    """The lines of an injected block that depend on its park point."""
+    px, py = park_xy
+    out = [f"; [INJECT] park before pre-cut: X{px:.3f} Y{py:.3f}"]
+    if args.m118_sentinels:
+        out.append(f"M118 [INJECT] PARK X{px:.1f} Y{py:.1f}")
+    out.append(f"G0 X{px:.3f} Y{py:.3f} F{args.travel_f}")
+    return out
+
+
+def transition_lines(fr: int, to: int, tool_line: str, args, park_xy):
+    """Lines replacing a real tool change `tool_line` (T<fr> -> T<to>)."""
     out = []
-    current_tool = None
 
     def m118(msg):
         if args.m118_sentinels:
             out.append(f"M118 {msg}")
 
-    def inject_precut(next_tool: int):
-        if park_xy is not None:
-            px, py = park_xy
-            out.append(f"; [INJECT] depart-hop before park: Z+{args.zhop_mm:.2f}")
-            out.append("G91")
-            out.append(f"G1 Z{args.zhop_mm:.2f} F{args.zhop_f}")
-            out.append("G90")
-            out.append(f"; [INJECT] park before pre-cut: X{px:.3f} Y{py:.3f}")
-            m118(f"[INJECT] PARK X{px:.1f} Y{py:.1f}")
-            out.append(f"G0 X{px:.3f} Y{py:.3f} F{args.travel_f}")
-        out.append(
-            f"; [INJECT] pre-cut retract before T{next_tool} ({args.precut_mm:.1f}mm @ F{args.precut_f})"
-        )
-        m118(f"[INJECT] PRECUT T{next_tool} E-{int(args.precut_mm)}; Start")
-        out.append(f"G1 E-{args.precut_mm:.1f} F{args.precut_f}")
-        m118(f"[INJECT] PRECUT T{next_tool} E-{int(args.precut_mm)}; End")
-
-    for ln in lines:
-        s = ln.strip()
-        mt = T_RE.match(s)
-        if mt:
-            to_tool = int(mt.group(1))
-            fr = current_tool
-            if fr is not None and fr != to_tool:
-                m118(f"[INJECT] TRANSITION T{fr} -> T{to_tool}; Start")
-                inject_precut(to_tool)
-                out.append(f"; [INJECT] selecting tool T{to_tool}")
-                out.append(ln)
-                m118(f"[INJECT] TRANSITION T{fr} -> T{to_tool}; End")
-            else:
-                out.append(ln)
-            current_tool = to_tool
-            continue
-        out.append(ln)
-
-    hdr = [f"; Post-processed by cfs_postproc on {datetime.now().isoformat(timespec='seconds')}"]
+    m118(f"[INJECT] TRANSITION T{fr} -> T{to}; Start")
+    if park_xy is not None:
+        out.append(f"; [INJECT] depart-hop before park: Z+{args.zhop_mm:.2f}")
+        out.append("G91")
+        out.append(f"G1 Z{args.zhop_mm:.2f} F{args.zhop_f}")
+        out.append("G90")
+        out.extend(park_lines(park_xy, args))
+    out.append(
+        f"; [INJECT] pre-cut retract before T{to} ({args.precut_mm:.1f}mm @ F{args.precut_f})"
+    )
+    m118(f"[INJECT] PRECUT T{to} E-{int(args.precut_mm)}; Start")
+    out.append(f"G1 E-{args.precut_mm:.1f} F{args.precut_f}")
+    m118(f"[INJECT] PRECUT T{to} E-{int(args.precut_mm)}; End")
+    out.append(f"; [INJECT] selecting tool T{to}")
+    out.append(tool_line)
+    m118(f"[INJECT] TRANSITION T{fr} -> T{to}; End")
+    return out
+
+
+def render_transition(fr: int, to: int, line: bytes, args, park_xy, eol: bytes = b"\n"):
+    """transition_lines() for a raw byte line, as one bytes block.
+
+    The tool line keeps its exact bytes; injected lines are terminated like it
+    (or with `eol` if it is the unterminated last line).
+    """
+    body, term = split_eol(line)
+    # latin-1 maps every byte to one code point, so the tool line round-trips unchanged
+    block = transition_lines(fr, to, body.decode("latin-1"), args, park_xy)
+    return (term or eol).join(ln.encode("latin-1") for ln in block) + term
+
+
+class TransitionTemplates:
+    """render_transition() with each injected block formatted only once per run.
+
+    Apart from the park lines, the injected text depends only on (from, to)
+    and the options, never on the tool line itself, so the block around the
+    tool line is rendered to bytes on first use per (from, to, terminator,
+    parked or not) and reused for every later transition. Per-layer parking
+    gives most transitions a park point of their own, so only the park_lines()
+    are formatted per park point. Instances are callables with
+    render_transition()'s `(fr, to, line, park_xy)`.
+    """
+
+    _TOOL = object()  # stands in for the tool line while rendering a template
+    _PARK = (0.0, 0.0)  # any park point: its lines are cut out of the template
+
+    def __init__(self, args, eol: bytes = b"\n"):
+        self.args = args
+        self.eol = eol
+        # (fr, to, terminator, parked) -> (before park, before tool line, after tool line)
+        self._blocks = {}
+        self._parks = {}  # (park, separator) -> park_lines() bytes
+
+    def _template(self, fr: int, to: int, parked: bool, term: bytes):
+        block = transition_lines(fr, to, self._TOOL, self.args, self._PARK if parked else None)
+        k = next(i for i, ln in enumerate(block) if ln is self._TOOL)
+        p = q = 0
+        if parked:
+            park = park_lines(self._PARK, self.args)
+            p = block.index(park[0])
+            q = p + len(park)
+        sep = term or self.eol
+        head = b"".join(ln.encode("latin-1") + sep for ln in block[:p])
+        before = b"".join(ln.encode("latin-1") + sep for ln in block[q:k])
+        after = b"".join(sep + ln.encode("latin-1") for ln in block[k + 1 :])
+        return head, before, after + term
+
+    def __call__(self, fr: int, to: int, line: bytes, park_xy) -> bytes:
+        body, term = split_eol(line)
+        key = (fr, to, term, park_xy is not None)
+        parts = self._blocks.get(key)
+        if parts is None:
+            parts = self._blocks[key] = self._template(fr, to, park_xy is not None, term)
+        if park_xy is None:
+            return parts[0] + parts[1] + body + parts[2]
+        sep = term or self.eol
+        park = self._parks.get((park_xy, sep))
+        if park is None:
+            park = self._parks[park_xy, sep] = b"".join(
+                ln.encode("latin-1") + sep for ln in park_lines(park_xy, self.args)
+            )
+        return parts[0] + park + parts[1] + body + parts[2]
+
+
+def replace_line(line: bytes, text: str) -> bytes:
+    """`text` in place of `line`'s content, keeping its terminator."""
+    return text.encode("utf-8") + split_eol(line)[1]
+
+
+def header_bytes(hdr, eol: bytes = b"\n") -> bytes:
+    return eol.join(h.encode("utf-8") for h in hdr) + eol + eol
+
+
+def rewrite_lines(lines, injections, render):
+    """Copy `lines`, replacing each injection's line with `render(fr, to, line, park_xy)`."""
+    out = []
+    prev = 0
+    for idx, fr, to, park_xy in injections:
+        out.extend(lines[prev:idx])
+        out.append(render(fr, to, lines[idx], park_xy))
+        prev = idx + 1
+    out.extend(lines[prev:])
+    return out
+
+
+def build_header(scan: ScanResult, scaled_matrix, park_xy, args, moved: int = 0):
+    orig_matrix = scan.matrix_nums
+    applied_mult = scan.flush_mult if scaled_matrix is not None else None
+    prime_volume = scan.prime_volume
+
+    hdr = [f"; Post-processed by cfs_postproc on {header_timestamp(args)}"]
     if applied_mult is not None:
         hdr.append(f"; applied_flush_multiplier: {applied_mult:.6f}")
-    if enable_prime_tower == 1 and prime_volume is not None:
+    if scan.enable_prime_tower == 1 and prime_volume is not None:
         hdr.append(f"; prime_volume subtracted: {prime_volume} mm^3 (prime tower enabled)")
     elif prime_volume is not None:
         hdr.append(f"; prime_volume found: {prime_volume} mm^3 (but prime tower disabled)")
-    if matrix_rewritten:
+    if scaled_matrix is not None:
+        n = scan.tool_count
         hdr.append("; original flush_volumes_matrix (mm^3):")
-        for r in range(4):
-            hdr.append(";   " + ", ".join(f"{orig_matrix[r*4+c]:4d}" for c in range(4)))
+        for r in range(0, n * n, n):
+            hdr.append(";   " + ", ".join(f"{v:4d}" for v in orig_matrix[r : r + n]))
         hdr.append("; scaled flush_volumes_matrix (mm^3) written:")
-        for r in range(4):
-            hdr.append(";   " + ", ".join(f"{scaled_matrix[r*4+c]:4d}" for c in range(4)))
+        for r in range(0, n * n, n):
+            hdr.append(";   " + ", ".join(f"{v:4d}" for v in scaled_matrix[r : r + n]))
     else:
         if applied_mult is None and orig_matrix is None:
             hdr.append("; no Creality flush comments found → only injected pre-cut retracts")
@@ -298,12 +387,658 @@ def main():
         )
     else:
         hdr.append("; park XY: not found (no tower detected and no override)")
+    if moved:
+        hdr.append(
+            f"; park XY per layer: {moved} of {len(scan.transitions)} transitions parked over "
+            "their layer's tower"
+        )
+    hdr.append(FINGERPRINT_PREFIX + options_fingerprint(args))
+    return hdr
+
+
+def _matrix_rows(nums, n: int):
+    return None if nums is None else [list(nums[r : r + n]) for r in range(0, n * n, n)]
+
+
+def plan_summary(scan: ScanResult, scaled_matrix, injections, replacements, args, moved: int = 0):
+    """Machine-readable counterpart of build_header() (JSON types only)."""
+    n = scan.tool_count
+    pv = scan.prime_volume
+    park_xy = resolve_park_xy(scan, args.precut_park_xy)
+    pairs = {}
+    for _, fr, to, _ in injections:
+        pairs[fr, to] = pairs.get((fr, to), 0) + 1
+    parked = sum(p is not None for *_, p in injections)
+    # Lines per injected block, not counting the tool line it wraps
+    per_block = [len(transition_lines(0, 1, "", args, xy)) - 1 for xy in (None, (0.0, 0.0))]
+    return {
+        "applied_flush_multiplier": scan.flush_mult if scaled_matrix is not None else None,
+        "flush_multiplier_found": scan.flush_mult,
+        "tool_count": n,
+        "original_matrix": _matrix_rows(scan.matrix_nums, n),
+        "scaled_matrix": _matrix_rows(scaled_matrix, n),
+        "prime_volume": (
+            None
+            if pv is None
+            else {
+                "mm3": pv,
+                "prime_tower": scan.enable_prime_tower == 1,
+                "subtracted": scan.enable_prime_tower == 1 and scaled_matrix is not None and pv > 0,
+            }
+        ),
+        "park": {
+            "xy": None if park_xy is None else list(park_xy),
+            "source": park_source(scan, args.precut_park_xy),
+            "per_layer": moved,
+        },
+        "transitions": len(injections),
+        "transition_counts": [
+            {"from": fr, "to": to, "count": c} for (fr, to), c in sorted(pairs.items())
+        ],
+        "injected_lines": parked * per_block[1] + (len(injections) - parked) * per_block[0],
+        "replaced_lines": len(replacements),
+    }
+
+
+def source_date_epoch() -> int:
+    """SOURCE_DATE_EPOCH (default 0); ValueError if it is not an integer."""
+    value = os.environ.get("SOURCE_DATE_EPOCH", "0")
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f"SOURCE_DATE_EPOCH must be an integer, not {value!r}") from None
+
+
+def header_epoch(args) -> int | None:
+    """The header time pinned by `args.deterministic` (seconds since the epoch), else None."""
+    return source_date_epoch() if getattr(args, "deterministic", False) else None
+
+
+def header_timestamp(args) -> str:
+    """Local time now, or with `args.deterministic` SOURCE_DATE_EPOCH (default 0) in UTC."""
+    epoch = header_epoch(args)
+    if epoch is None:
+        return time.strftime(ISO_SECONDS)
+    return time.strftime(ISO_SECONDS, time.gmtime(epoch))
+
+
+def options_fingerprint(args) -> str:
+    """Short stable hash of the OUTPUT_OPTIONS values of `args`."""
+    values = [FINGERPRINT_VERSION] + [(k, getattr(args, k, None)) for k in OUTPUT_OPTIONS]
+    return hashlib.sha256(repr(values).encode("utf-8")).hexdigest()[:16]
+
+
+def read_fingerprint(path, limit: int = EOL_PROBE):
+    """Options fingerprint recorded in the header of an output file, or None."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(limit)
+    except OSError:
+        return None
+    prefix = FINGERPRINT_PREFIX.encode("ascii")
+    i = head.find(prefix)
+    if i < 0:
+        return None
+    fp = head[i + len(prefix) : i + len(prefix) + 16]
+    return fp.decode("ascii", errors="replace")
+
+
+def plan_edits(scan: ScanResult, args):
+    """Decide park points, scaled matrix, replaced comment lines and the header.
+
+    Returns (injections, replacements, header lines, summary); an injection is
+    (line index, from tool, to tool, park point) for every real transition and
+    the summary is plan_summary(), the header's facts as a dict.
+    """
+    park_xy = resolve_park_xy(scan, args.precut_park_xy)
+    parks = transition_parks(scan, args.precut_park_xy, park_xy)
+    injections = [(idx, fr, to, p) for (idx, fr, to), p in zip(scan.transitions, parks)]
+    scaled_matrix = scale_matrix(scan)
+
+    replacements = {}
+    if scaled_matrix is not None:
+        new_payload = ", ".join(str(v) for v in scaled_matrix)
+        replacements[scan.matrix_idx] = f"; flush_volumes_matrix = {new_payload}"
+
+    # Force output multiplier to 1.0 if present
+    if scan.flush_mult_idx is not None:
+        replacements[scan.flush_mult_idx] = "; flush_multiplier = 1.0"
+
+    moved = sum(p != park_xy for p in parks)
+    hdr = build_header(scan, scaled_matrix, park_xy, args, moved)
+    summary = plan_summary(scan, scaled_matrix, injections, replacements, args, moved)
+    return injections, replacements, hdr, summary
+
+
+def scan_regions(region_batches, tower_stable_layers: int | None = None) -> ScanResult:
+    """Scan (region name, line batch) pairs in file order; thumbnails are only counted."""
+    scanner = LineScanner(tower_stable_layers=tower_stable_layers)
+    idx = 0
+    for name, batch in region_batches:
+        if name != THUMBNAIL:
+            scanner.feed(batch, idx)
+        idx += len(batch)
+    return scanner.finish()
+
+
+def _line_span(buf, start: int):
+    nl = buf.find(b"\n", start)
+    return start, (len(buf) if nl < 0 else nl + 1)
+
+
+def splice_edits(buf, scan: ScanResult, injections, replacements, args, eol: bytes):
+    """Sorted (start, end, replacement) byte edits of `buf` for splice_file()."""
+    edits = []
+    for idx, text in replacements.items():
+        start, end = _line_span(buf, scan.offsets[idx])
+        edits.append((start, end, replace_line(buf[start:end], text)))
+    render = TransitionTemplates(args, eol)
+    for idx, fr, to, park_xy in injections:
+        start, end = _line_span(buf, scan.offsets[idx])
+        edits.append((start, end, render(fr, to, buf[start:end], park_xy)))
+    edits.sort(key=lambda e: e[0])
+    return edits
+
+
+def process_spliced(infile, outfile, args, index: bool = False, timer: StageTimer | None = None):
+    """Zero-copy process_file(): only the header and the edited lines pass through Python.
+
+    With `index`, the scan is taken from a current `<infile>.idx` sidecar if
+    there is one, and otherwise written there for the next run.
+
+    Returns (header lines, plan summary), or None (nothing written) if the input
+    is empty or has lone "\\r" line breaks (see plain_line_breaks()).
+    """
+    timer = timer if timer is not None else StageTimer()
+    path = Path(infile)
+    size = path.stat().st_size
+    if size == 0:
+        return None
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        stable = getattr(args, "tower_stable_layers", None)
+        scan = None
+        if index:
+            with timer.stage("load index"):
+                scan = load_index(path, buf, stable)
+        if scan is None:
+            with timer.stage("scan", size) as st:
+                if not plain_line_breaks(buf):
+                    return None
+                scan = sparse_scan(buf, LineScanner(tower_stable_layers=stable))
+                st.lines = scan.line_count
+            if index:
+                with timer.stage("save index", size):
+                    save_index(path, buf, scan, stable)
+        with timer.stage("plan", lines=len(scan.transitions)):
+            injections, replacements, hdr, summary = plan_edits(scan, args)
+        with timer.stage("render", lines=len(injections)):
+            eol = detect_eol(buf[:EOL_PROBE])
+            edits = splice_edits(buf, scan, injections, replacements, args, eol)
+
+    with timer.stage("write") as st:
+        splice_file(path, Path(outfile), header_bytes(hdr, eol), edits)
+        st.nbytes = Path(outfile).stat().st_size
+    return hdr, summary
+
+
+def _rewrite_buffer(data: bytes, args, timer: StageTimer | None = None):
+    """(header bytes, rewritten line batches, header lines, plan summary) for a buffer.
+
+    The batches are rewritten lazily, as they are consumed.
+    """
+    timer = timer if timer is not None else StageTimer()
+    with timer.stage("split", len(data)) as st:
+        parts = [
+            (r.name, data[r.start : r.end].splitlines(keepends=True))
+            for r in regions(index_blocks(data), len(data))
+        ]
+        st.lines = sum(len(lines) for _, lines in parts)
+    stable = getattr(args, "tower_stable_layers", None)
+    with timer.stage("scan", len(data)) as st:
+        if plain_line_breaks(data):
+            scan = sparse_scan(data, LineScanner(tower_stable_layers=stable))
+        else:
+            scan = scan_regions(parts, stable)
+        st.lines = scan.line_count
+    with timer.stage("plan", lines=len(scan.transitions)):
+        injections, replacements, hdr, summary = plan_edits(scan, args)
+    eol = detect_eol(data[:EOL_PROBE])
+
+    out = rewrite_batches(
+        [lines for _, lines in parts],
+        injections,
+        replacements,
+        TransitionTemplates(args, eol),
+    )
+    return header_bytes(hdr, eol), out, hdr, summary
+
+
+def process_data(data, args):
+    """Process a whole G-code buffer in memory; returns (output, header lines).
+
+    `data` may be `bytes` or `str`; the output has the same type. A `str` is
+    handled as UTF-8 with surrogate escapes, so undecodable bytes survive too.
+    """
+    if isinstance(data, str):
+        out, hdr = process_data(data.encode("utf-8", errors="surrogateescape"), args)
+        return out.decode("utf-8", errors="surrogateescape"), hdr
+    head, out, hdr, _ = _rewrite_buffer(data, args)
+    return head + b"".join(chain.from_iterable(out)), hdr
+
+
+def process_file(
+    infile,
+    outfile,
+    args,
+    splice: bool = True,
+    index: bool = False,
+    timer: StageTimer | None = None,
+):
+    """Process `infile` in memory and write `outfile`; returns (header lines, plan summary).
+
+    With `splice`, eligible inputs go through process_spliced() instead.
+    Stages are recorded in `timer` if given.
+    """
+    timer = timer if timer is not None else StageTimer()
+    if splice:
+        done = process_spliced(infile, outfile, args, index, timer)
+        if done is not None:
+            return done
+
+    with timer.stage("read") as st:
+        data = Path(infile).read_bytes()
+        st.nbytes = len(data)
+    head, out, hdr, summary = _rewrite_buffer(data, args, timer)
+    with timer.stage("rewrite+write") as st:
+        write_batches(Path(outfile), head, out)
+        st.nbytes = Path(outfile).stat().st_size
+    return hdr, summary
+
+
+def rewrite_batches(batches, injections, replacements, render):
+    """Streaming rewrite: apply `replacements` and injections to consecutive line batches."""
+    pending = list(injections)
+    k = 0
+    offset = 0
+    for batch in batches:
+        end = offset + len(batch)
+        for idx, text in replacements.items():
+            if offset <= idx < end:
+                batch[idx - offset] = replace_line(batch[idx - offset], text)
+        j = k
+        while j < len(pending) and pending[j][0] < end:
+            j += 1
+        local = [(idx - offset, fr, to, park) for idx, fr, to, park in pending[k:j]]
+        yield rewrite_lines(batch, local, render) if local else batch
+        k = j
+        offset = end
+
+
+def process_stream(
+    infile,
+    outfile,
+    args,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    timer: StageTimer | None = None,
+):
+    """Like process_file(), but reads and writes incrementally in two streaming passes."""
+    timer = timer if timer is not None else StageTimer()
+    size = Path(infile).stat().st_size
+    rgns = regions(index_file(infile), size)
+
+    def region_batches():
+        for r in rgns:
+            for batch in iter_line_batches(infile, buffer_size, start=r.start, end=r.end):
+                yield r.name, batch
+
+    with timer.stage("scan", size) as st:
+        scan = scan_regions(region_batches(), getattr(args, "tower_stable_layers", None))
+        st.lines = scan.line_count
+    with timer.stage("plan", lines=len(scan.transitions)):
+        injections, replacements, hdr, summary = plan_edits(scan, args)
+    with open(infile, "rb") as f:
+        eol = detect_eol(f.read(EOL_PROBE))
+
+    out = rewrite_batches(
+        (batch for _, batch in region_batches()),
+        injections,
+        replacements,
+        TransitionTemplates(args, eol),
+    )
+    with timer.stage("rewrite+write") as st:
+        write_batches(Path(outfile), header_bytes(hdr, eol), out)
+        st.nbytes = Path(outfile).stat().st_size
+    return hdr, summary
+
+
+# Option -> default; one per command line flag except the report ones
+# (`--console-summary`, `--profile`, `--report-json`)
+OPTION_DEFAULTS = {
+    "precut_mm": 80.0,
+    "precut_f": 600,
+    "zhop_mm": 0.6,
+    "zhop_f": 3000,
+    "travel_f": 18000,
+    "precut_park_xy": None,
+    "m118_sentinels": False,
+    "tower_stable_layers": None,
+    "deterministic": False,
+    "stream": False,
+    "buffer_size": DEFAULT_BUFFER_SIZE,
+    "no_splice": False,
+    "jobs": 1,
+    "index": False,
+    "cache_dir": None,
+    "cache_size": DEFAULT_MAX_BYTES,
+}
+
+
+# Immutable like the frozen dataclass it would otherwise be; a named tuple
+# avoids importing `dataclasses` (and with it `inspect`) at start-up.
+class Options(namedtuple("Options", OPTION_DEFAULTS, defaults=OPTION_DEFAULTS.values())):
+    """Processing options of process(), as keyword arguments named like the flags.
+
+    Every way of making one (the constructor, from_args(), _replace() and
+    parse_args(), which builds one to check the flags) goes through _validated().
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, *args, **kwargs):
+        return super().__new__(cls, *args, **kwargs)._validated()
+
+    def _replace(self, **kwargs) -> Options:
+        return super()._replace(**kwargs)._validated()
+
+    def _validated(self) -> Options:
+        if self.jobs < 1:
+            raise ValueError("jobs must be at least 1")
+        if self.tower_stable_layers is not None and self.tower_stable_layers < 1:
+            raise ValueError("tower_stable_layers must be at least 1")
+        if self.jobs > 1 and self.stream:
+            raise ValueError("jobs > 1 cannot be combined with stream")
+        if self.index and (self.jobs > 1 or self.stream or self.no_splice):
+            # Only the single-process spliced path reads and writes the sidecar
+            raise ValueError("index cannot be combined with jobs > 1, stream or no_splice")
+        return self
+
+    @classmethod
+    def from_args(cls, args) -> Options:
+        """Options from any object with option attributes (e.g. parse_args() output)."""
+        return cls(**{k: getattr(args, k, d) for k, d in OPTION_DEFAULTS.items()})
+
+
+class Report(SimpleNamespace):
+    """Outcome of one process() call.
+
+    `header` holds the header lines, `fingerprint` the options fingerprint,
+    `cached` whether the output was taken from the result cache, `seconds`
+    the wall time of the call and `stages` its timed steps (see stages.py).
+    `profile` is the cProfile stats file written on request, else None.
+    `plan` is plan_summary() of the run (on a cache hit, the one stored with
+    the entry); `input_bytes` / `output_bytes` are the file sizes.
+    """
+
+    def __init__(
+        self,
+        infile,
+        outfile,
+        header=(),
+        fingerprint="",
+        cached=False,
+        seconds=0.0,
+        stages=(),
+        profile=None,
+        plan=None,
+        input_bytes=0,
+        output_bytes=0,
+    ):
+        super().__init__(
+            infile=str(infile),
+            outfile=str(outfile),
+            header=list(header),
+            fingerprint=fingerprint,
+            cached=cached,
+            seconds=seconds,
+            stages=list(stages),
+            profile=profile,
+            plan=plan,
+            input_bytes=input_bytes,
+            output_bytes=output_bytes,
+        )
+
+    def as_dict(self) -> dict:
+        """The report as JSON types (`--report-json`); `header` is left out."""
+        return {
+            "version": REPORT_VERSION,
+            "infile": self.infile,
+            "outfile": self.outfile,
+            "input_bytes": self.input_bytes,
+            "output_bytes": self.output_bytes,
+            "fingerprint": self.fingerprint,
+            "cached": self.cached,
+            "seconds": self.seconds,
+            **(self.plan or {}),
+            "stages": [s.as_dict() for s in self.stages],
+            "profile": self.profile,
+        }
+
+    def to_json(self) -> str:
+        """as_dict() as one line of JSON."""
+        import json  # imported on use: runs without a JSON report skip it
+
+        return json.dumps(self.as_dict())
+
+
+def process(
+    infile, outfile, options: Options | None = None, timer: StageTimer | None = None
+) -> Report:
+    """Process `infile` into `outfile` with `options` (default: Options()).
+
+    With `options.cache_dir`, a cached result for the same input bytes and
+    options is reused instead of processing. The steps are timed in `timer`
+    (a new StageTimer by default; pass one to get `on_stage` callbacks) and
+    end up in `report.stages`. CFS_POSTPROC_PROFILE adds cProfile and
+    tracemalloc capture (see stages.py).
+    """
+    opts = options if options is not None else Options()
+    timer = timer if timer is not None else StageTimer()
+    t0 = time.perf_counter()
+    report = Report(infile, outfile, fingerprint=options_fingerprint(opts))
+
+    modes = profile_modes()
+    tracing = profiler = None
+    if "tracemalloc" in modes:
+        import tracemalloc
+
+        tracing = not tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.start()
+        timer.trace_memory = True
+    if "cprofile" in modes:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        _process_cached(infile, outfile, opts, timer, report)
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            report.profile = f"{outfile}{PROFILE_SUFFIX}"
+            profiler.dump_stats(report.profile)
+        if tracing:
+            tracemalloc.stop()
+    report.stages = timer.stages
+    report.input_bytes = Path(infile).stat().st_size
+    report.output_bytes = Path(outfile).stat().st_size
+    report.seconds = time.perf_counter() - t0
+    return report
+
+
+def _process_cached(infile, outfile, opts: Options, timer: StageTimer, report: Report):
+    cache = None
+    if opts.cache_dir:
+        cache = ResultCache(opts.cache_dir, opts.cache_size)
+        with timer.stage("digest", Path(infile).stat().st_size):
+            key = cache.key(digest_file(infile), report.fingerprint, header_epoch(opts))
+        with timer.stage("cache fetch"):
+            report.plan = cache.fetch(key, Path(outfile))
+    if report.plan is not None:
+        report.cached = True
+        report.header = read_header(outfile)
+        return
+    report.header, report.plan = _process(infile, outfile, opts, timer)
+    if cache is not None:
+        with timer.stage("cache store"):
+            cache.store(key, Path(outfile), report.plan)
+
+
+def _process(infile, outfile, opts: Options, timer: StageTimer):
+    if opts.jobs > 1:
+        # Imported here: parallel.py builds on this module
+        from cfs_postproc.parallel import process_parallel
+
+        return process_parallel(
+            infile, outfile, opts, opts.jobs, splice=not opts.no_splice, timer=timer
+        )
+    if opts.stream:
+        return process_stream(infile, outfile, opts, buffer_size=opts.buffer_size, timer=timer)
+    return process_file(
+        infile, outfile, opts, splice=not opts.no_splice, index=opts.index, timer=timer
+    )
+
+
+def build_parser():
+    import argparse  # only the command line needs it; process() callers skip the import
+
+    d = SimpleNamespace(**OPTION_DEFAULTS)  # flag defaults
+    ap = argparse.ArgumentParser(
+        description="Rewrite flush_volumes_matrix by applying in-file flush_multiplier; inject safe pre-cut retracts."
+    )
+    ap.add_argument("infile", type=str, help="Input G-code")
+    ap.add_argument("outfile", type=str, help="Output G-code")
+    ap.add_argument(
+        "--precut-mm", type=float, default=d.precut_mm, help="Pre-cut retract amount (mm)"
+    )
+    ap.add_argument("--precut-f", type=int, default=d.precut_f, help="Pre-cut retract feedrate")
+    ap.add_argument(
+        "--zhop-mm", type=float, default=d.zhop_mm, help="Depart Z-hop before moving to park"
+    )
+    ap.add_argument("--zhop-f", type=int, default=d.zhop_f, help="Feedrate for depart Z-hop")
+    ap.add_argument(
+        "--travel-f", type=int, default=d.travel_f, help="Feedrate for XY travel to park"
+    )
+    ap.add_argument(
+        "--precut-park-xy",
+        type=str,
+        default=None,
+        help='Override park "X,Y" (else autodetect tower center)',
+    )
+    ap.add_argument(
+        "--m118-sentinels",
+        action="store_true",
+        help="Print M118 start/end markers around transitions and pre-cuts",
+    )
+    ap.add_argument("--console-summary", action="store_true", help="Print header summary to stderr")
+    ap.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print wall time, bytes, lines and MB/s per processing stage to stderr",
+    )
+    ap.add_argument(
+        "--report-json",
+        type=str,
+        default=None,
+        metavar="PATH",
+        help="Write a machine-readable JSON report of the run to PATH ('-' for stdout)",
+    )
+    ap.add_argument(
+        "--stream",
+        action="store_true",
+        help="Process incrementally with memory bounded by --buffer-size (same output)",
+    )
+    ap.add_argument(
+        "--buffer-size",
+        type=int,
+        default=d.buffer_size,
+        help="Read batch size in bytes for --stream",
+    )
+    ap.add_argument(
+        "--no-splice",
+        action="store_true",
+        help="Always build the output in memory instead of splicing unchanged byte ranges",
+    )
+    ap.add_argument(
+        "--jobs",
+        type=int,
+        default=d.jobs,
+        help="Scan (and, with --no-splice, rewrite) layer chunks in N worker processes",
+    )
+    ap.add_argument(
+        "--cache-dir",
+        type=str,
+        default=None,
+        help="Reuse results for identical input and options from this cache directory",
+    )
+    ap.add_argument(
+        "--cache-size",
+        type=int,
+        default=d.cache_size,
+        help="Cache size limit in bytes; least recently used entries are evicted",
+    )
+    ap.add_argument(
+        "--tower-stable-layers",
+        type=int,
+        default=None,
+        metavar="K",
+        help="Stop measuring the tower once K consecutive layers have the same footprint",
+    )
+    ap.add_argument(
+        "--index",
+        action="store_true",
+        help="Reuse (or write) an <infile>.idx scan sidecar; re-runs with other options skip the scan",
+    )
+    ap.add_argument(
+        "--deterministic",
+        action="store_true",
+        help="Pin the header timestamp to SOURCE_DATE_EPOCH (default 0) for reproducible output",
+    )
+    return ap
+
+
+def parse_args(argv=None):
+    ap = build_parser()
+    args = ap.parse_args(argv)
+    try:
+        Options.from_args(args)  # the option rules live in Options
+        if args.deterministic:
+            source_date_epoch()
+    except ValueError as e:
+        ap.error(str(e))
+    return args
+
+
+def run(args):
+    """Process `args.infile` into `args.outfile` as the command line would; returns the header."""
+    report = process(args.infile, args.outfile, Options.from_args(args))
+    if getattr(args, "console_summary", False):
+        sys.stderr.write("\n".join(report.header) + "\n")
+    if getattr(args, "profile", False):
+        lines = format_stages(report.stages, report.seconds)
+        if report.profile is not None:
+            lines.append(f"cProfile stats: {report.profile}")
+        sys.stderr.write("\n".join(lines) + "\n")
+    report_json = getattr(args, "report_json", None)
+    if report_json == "-":
+        sys.stdout.write(report.to_json() + "\n")
+    elif report_json:
+        atomic_write_text(Path(report_json), report.to_json() + "\n")
+    return report.header
 
-    out_text = "\n".join(hdr) + "\n\n" + "\n".join(out) + "\n"
-    atomic_write_text(Path(args.outfile), out_text, encoding="utf-8")
 
-    if args.console_summary:
-        sys.stderr.write("\n".join(hdr) + "\n")
+def main(argv=None):
+    run(parse_args(argv))
 
 
 if __name__ == "__main__":
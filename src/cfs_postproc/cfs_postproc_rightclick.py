@@ -1,62 +1,287 @@
 #!/usr/bin/env python3
 """
 cfs_postproc_rightclick.py
-Right-click / CLI wrapper for cfs_postproc.py
+Right-click / CLI wrapper for cfs_postproc.py (`cfs-postproc-batch` when installed)
+
+Files are processed in-process through the engine's `process()` API,
+so interpreter startup, imports and regex compilation are paid once per worker
+instead of once per file. With `--jobs N` (default: all cores) files are spread
+over a process pool and each file's log is printed as soon as it finishes.
+A failure on one file is reported and the batch continues; the exit code is
+that of the last failing file in argument order (0 if all succeed).
+
+Directory arguments are searched recursively for `.gcode` / `.gcode.pp` files.
+An input is skipped when its output is newer and carries the same options
+fingerprint in its header. Finished inputs are appended to a journal in the
+directory (`.cfs_postproc.journal`), so an interrupted run resumes without
+even opening the outputs of files it already did.
+
+With `--ndjson`, stdout carries one JSON object per processed file (the
+engine's `--report-json` document, or `{"infile", "error"}` on a failure)
+and the log lines go to stderr.
 """
-import shlex
-import subprocess
+
+import argparse
+import io
+import json
+import os
 import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stderr, redirect_stdout
 from pathlib import Path
 
-INJECTOR = "cfs_postproc.py"
+if __package__ in (None, ""):
+    # Executed as a plain script from a source checkout: put the package root
+    # on sys.path so the engine modules resolve. Installed, use `cfs-postproc-batch`.
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from cfs_postproc import cfs_postproc
+
+# Processing options of every file; the header is always printed (as --console-summary)
+OPTIONS = cfs_postproc.Options(m118_sentinels=True)
+JOURNAL_NAME = ".cfs_postproc.journal"
+OUT_SUFFIX = "_scaled_precut.gcode"
 
 
 def out_path(p: Path) -> Path:
     if "".join(p.suffixes).lower().endswith(".gcode.pp"):
         base = p.with_suffix("")
-        return base.with_name(f"{base.stem}_scaled_precut.gcode")
+        return base.with_name(f"{base.stem}{OUT_SUFFIX}")
     if p.suffix.lower() == ".gcode":
-        return p.with_name(f"{p.stem}_scaled_precut.gcode")
-    return p.with_name(f"{p.name}_scaled_precut.gcode")
+        return p.with_name(f"{p.stem}{OUT_SUFFIX}")
+    return p.with_name(f"{p.name}{OUT_SUFFIX}")
+
+
+def describe_options(options) -> str:
+    """The options that differ from their defaults, as `name=value` pairs."""
+    changed = [
+        f"{k}={v!r}" for k, v in options._asdict().items() if v != cfs_postproc.OPTION_DEFAULTS[k]
+    ]
+    return ", ".join(changed) or "defaults"
+
+
+def iter_gcode(root: Path):
+    """`.gcode` / `.gcode.pp` files below `root` (sorted), excluding our own outputs."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            low = name.lower()
+            if low.endswith((".gcode", ".gcode.pp")) and not low.endswith(OUT_SUFFIX):
+                yield Path(dirpath, name)
+
+
+class Journal:
+    """Progress journal of a directory run: one JSON object per finished input.
+
+    Entries record the input's size, mtime and the options fingerprint it was
+    processed with; an input whose entry still matches is done. The file is
+    append-only while running (a torn last line from a crash is ignored) and
+    compacted on close.
+    """
+
+    def __init__(self, path: Path, fingerprint: str):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.entries = {}
+        self.lines = 0
+        self._f = None
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        e = json.loads(line)
+                        self.entries[e["src"]] = (e["size"], e["mtime_ns"], e["fp"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+                    self.lines += 1
+        except OSError:
+            pass
+
+    def _key(self, inp: Path) -> str:
+        return os.path.relpath(inp, self.path.parent)
+
+    def is_done(self, inp: Path, st: os.stat_result) -> bool:
+        e = self.entries.get(self._key(inp))
+        return e == (st.st_size, st.st_mtime_ns, self.fingerprint)
+
+    def record(self, inp: Path):
+        st = inp.stat()
+        key = self._key(inp)
+        self.entries[key] = (st.st_size, st.st_mtime_ns, self.fingerprint)
+        if self._f is None:
+            self._f = open(self.path, "a", encoding="utf-8")
+        self._f.write(self._line(key, self.entries[key]))
+        self._f.flush()
+        self.lines += 1
 
+    @staticmethod
+    def _line(key, entry) -> str:
+        size, mtime_ns, fp = entry
+        return json.dumps({"src": key, "size": size, "mtime_ns": mtime_ns, "fp": fp}) + "\n"
 
-def run_one(inp: Path) -> int:
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        if self.lines > len(self.entries):
+            tmp = self.path.with_name(self.path.name + ".tmp")
+            tmp.write_text("".join(self._line(k, e) for k, e in self.entries.items()), "utf-8")
+            tmp.replace(self.path)
+            self.lines = len(self.entries)
+
+
+def up_to_date(inp: Path, journal: Journal) -> bool:
+    """True if `inp`'s output exists and was made from this input with the same options."""
+    try:
+        st = inp.stat()
+        out_st = out_path(inp).stat()
+    except OSError:
+        return False
+    if journal.is_done(inp, st):
+        return True
+    if out_st.st_mtime_ns < st.st_mtime_ns:
+        return False
+    if cfs_postproc.read_fingerprint(out_path(inp)) != journal.fingerprint:
+        return False
+    journal.record(inp)  # next time the journal alone answers
+    return True
+
+
+def run_one(inp: Path, ndjson: bool = False) -> int:
     if not inp.exists():
         print(f"[SKIP] {inp}", file=sys.stderr)
+        if ndjson:
+            print(json.dumps({"infile": str(inp), "error": "not found"}))
         return 2
-    injector = Path(__file__).with_name(INJECTOR)
-    if not injector.exists():
-        print(f"[ERR] Injector not found: {injector}", file=sys.stderr)
-        return 2
+    log = sys.stderr if ndjson else sys.stdout
     out = out_path(inp)
-    cmd = [
-        sys.executable,
-        str(injector),
-        str(inp),
-        str(out),
-        "--m118-sentinels",
-        "--console-summary",
-    ]
-    print("[RUN]", " ".join(shlex.quote(x) for x in cmd))
+    print(f"[RUN] {inp} -> {out} ({describe_options(OPTIONS)})", file=log)
+    t0 = time.perf_counter()
     try:
-        rc = subprocess.run(cmd).returncode
-    except FileNotFoundError:
-        print("[ERR] Python not found", file=sys.stderr)
-        return 127
+        report = cfs_postproc.process(inp, out, OPTIONS)
+    except Exception as e:
+        print(f"[ERR] {inp.name}: {type(e).__name__}: {e}", file=sys.stderr)
+        if ndjson:
+            print(json.dumps({"infile": str(inp), "error": f"{type(e).__name__}: {e}"}))
+        rc = 1
+    else:
+        sys.stderr.write("\n".join(report.header) + "\n")
+        if ndjson:
+            print(report.to_json())
+        rc = 0
+    dt = time.perf_counter() - t0
     if rc != 0:
-        print(f"[WARN] Injector returned {rc} for {inp.name}", file=sys.stderr)
+        print(f"[WARN] Injector returned {rc} for {inp.name} ({dt:.2f}s)", file=sys.stderr)
         return rc
-    print(f"[OK] -> {out}")
+    print(f"[OK] -> {out} ({dt:.2f}s)", file=log)
     return 0
 
 
-def main(argv):
-    if not argv:
-        print("Usage: cfs_postproc_rightclick.py <file.gcode> [...]", file=sys.stderr)
+def run_captured(inp: str, ndjson: bool = False):
+    """run_one() in a pool worker: (rc, stdout text, stderr text)."""
+    out, err = io.StringIO(), io.StringIO()
+    with redirect_stdout(out), redirect_stderr(err):
+        rc = run_one(Path(inp), ndjson)
+    return rc, out.getvalue(), err.getvalue()
+
+
+def run_all(inputs, jobs: int, on_done, ndjson: bool = False):
+    """run_one() every input, `jobs` at a time; returns the exit codes in input order.
+
+    `on_done(i, rc)` is called in the calling process as each input finishes.
+    """
+    rcs = [0] * len(inputs)
+    if jobs <= 1:
+        for i, a in enumerate(inputs):
+            rcs[i] = run_one(Path(a), ndjson)
+            on_done(i, rcs[i])
+        return rcs
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        futures = {pool.submit(run_captured, a, ndjson): i for i, a in enumerate(inputs)}
+        for fut in as_completed(futures):
+            i = futures[fut]
+            try:
+                rcs[i], out, err = fut.result()
+            except Exception as e:
+                # The worker itself died (e.g. killed); only this file is affected
+                rcs[i], out, err = 1, "", f"[ERR] {inputs[i]}: {type(e).__name__}: {e}\n"
+                if ndjson:
+                    out = json.dumps({"infile": inputs[i], "error": f"{type(e).__name__}: {e}"})
+                    out += "\n"
+            sys.stdout.write(out)
+            sys.stdout.flush()
+            sys.stderr.write(err)
+            on_done(i, rcs[i])
+    return rcs
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="cfs-postproc-batch")
+    ap.add_argument("paths", nargs="*", help="G-code files, or directories to search recursively")
+    ap.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Files processed in parallel (default: number of cores)",
+    )
+    ap.add_argument(
+        "--force",
+        action="store_true",
+        help="Reprocess files found in directories even if their output is up to date",
+    )
+    ap.add_argument(
+        "--ndjson",
+        action="store_true",
+        help="Print one JSON report per processed file on stdout (log lines go to stderr)",
+    )
+    opts = ap.parse_args(argv)
+    if not opts.paths:
+        print(
+            "Usage: cfs-postproc-batch [--jobs N] [--ndjson] <file.gcode|directory> [...]",
+            file=sys.stderr,
+        )
         return 1
+
+    fingerprint = cfs_postproc.options_fingerprint(OPTIONS)
+    inputs = []
+    journals = []  # per input: the Journal of its directory argument, or None
+    opened = []
+    skipped = 0
+    for a in opts.paths:
+        root = Path(a)
+        if not root.is_dir():
+            inputs.append(a)
+            journals.append(None)
+            continue
+        journal = Journal(root / JOURNAL_NAME, fingerprint)
+        opened.append(journal)
+        for f in iter_gcode(root):
+            if not opts.force and up_to_date(f, journal):
+                skipped += 1
+                continue
+            inputs.append(str(f))
+            journals.append(journal)
+
+    def on_done(i, rc):
+        if rc == 0 and journals[i] is not None:
+            journals[i].record(Path(inputs[i]))
+
+    try:
+        rcs = run_all(inputs, max(1, min(opts.jobs, len(inputs))), on_done, opts.ndjson)
+    finally:
+        for journal in opened:
+            journal.close()
+    if skipped:
+        print(
+            f"[DONE] {len(inputs)} processed, {skipped} up to date",
+            file=sys.stderr if opts.ndjson else sys.stdout,
+        )
     rc = 0
-    for a in argv:
-        rc = run_one(Path(a)) or rc
+    for r in rcs:
+        rc = r or rc
     return rc
 
 
@@ -0,0 +1,183 @@
+"""
+config.py
+Fast access to the slicer settings Creality Print appends to the G-code.
+
+Creality Print writes every setting (`flush_multiplier`, `flush_volumes_matrix`,
+`prime_volume`, `enable_prime_tower`, `wipe_tower_x/y`, ...) between
+`; CONFIG_BLOCK_START` and `; CONFIG_BLOCK_END` at the very end of the file.
+`find_config_block()` locates that region by reading backwards from EOF (with
+the block markers and tail limit of blocks.py), so metadata discovery costs
+O(config block) instead of O(file). Only when no block is found does
+`read_metadata()` fall back to a full streaming scan.
+
+`ConfigBlock` is the parser of that block: it splits the `; key = value` lines
+once into a dictionary and offers typed, cached accessors, so new keys need no
+new regexes. The keys the rewrite acts on are converted by the scan's own
+setters (`scan.SCAN_KEYS`), so a value means the same in the block as it does
+to the scan of the G-code.
+"""
+
+from __future__ import annotations
+
+from pathlib import Path
+
+from cfs_postproc.blocks import MAX_TAIL, find_tail_block
+from cfs_postproc.scan import RE_SETTING, SCAN_KEYS, ScanResult, scan_lines, split_colours
+from cfs_postproc.stream import iter_lines
+
+
+def find_config_block(path, max_tail: int = MAX_TAIL):
+    """Byte range (start, end) of the trailing CONFIG_BLOCK, or None.
+
+    `start` is the offset of the `; CONFIG_BLOCK_START` line, `end` the offset just
+    past the `; CONFIG_BLOCK_END` line (including its terminator).
+    """
+    block = find_tail_block(path, "CONFIG", max_tail)
+    return None if block is None else (block.start, block.end)
+
+
+def read_config_block(path, max_tail: int = MAX_TAIL):
+    """Byte lines of the trailing CONFIG_BLOCK, or None when the file has none."""
+    rng = find_config_block(path, max_tail)
+    if rng is None:
+        return None
+    start, end = rng
+    with open(path, "rb") as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return data.splitlines(keepends=True)
+
+
+class ConfigBlock:
+    """`; key = value` settings split once into a dict, with typed cached accessors.
+
+    Keys are case-insensitive and, as in the scan, the first occurrence of a key
+    wins. Typed accessors return `default` when the key is missing or its value
+    does not convert; converted values are cached, so repeated lookups are O(1).
+    `line_index` maps each key to the index of its line within the block.
+    """
+
+    def __init__(self, settings: dict[str, str], line_index: dict[str, int] | None = None):
+        self.settings = settings
+        self.line_index = {} if line_index is None else line_index
+        self._cache: dict[tuple[str, str], object] = {}
+
+    @classmethod
+    def from_lines(cls, lines) -> ConfigBlock:
+        """Build from `str` or `bytes` lines; bytes values are decoded as UTF-8."""
+        settings = {}
+        line_index = {}
+        for i, ln in enumerate(lines):
+            if isinstance(ln, str):
+                ln = ln.encode("utf-8")
+            m = RE_SETTING.match(ln)
+            if m:
+                key, value = (g.decode("utf-8", errors="replace") for g in m.groups())
+                key = key.lower()
+                if key not in settings:
+                    settings[key] = value
+                    line_index[key] = i
+        return cls(settings, line_index)
+
+    @classmethod
+    def from_file(cls, path) -> ConfigBlock | None:
+        lines = read_config_block(path)
+        return None if lines is None else cls.from_lines(lines)
+
+    def __contains__(self, key: str) -> bool:
+        return key.lower() in self.settings
+
+    def __len__(self) -> int:
+        return len(self.settings)
+
+    def get(self, key: str, default=None):
+        return self.settings.get(key.lower(), default)
+
+    def _typed(self, key: str, kind: str, conv, default):
+        ck = (key.lower(), kind)
+        try:
+            value = self._cache[ck]
+        except KeyError:
+            raw = self.settings.get(ck[0])
+            try:
+                value = None if raw is None else conv(raw)
+            except ValueError:
+                value = None
+            self._cache[ck] = value
+        return default if value is None else value
+
+    def get_float(self, key: str, default=None):
+        return self._typed(key, "float", float, default)
+
+    def get_int(self, key: str, default=None):
+        return self._typed(key, "int", int, default)
+
+    def get_int_list(self, key: str, default=None):
+        """Comma-separated integers, e.g. `flush_volumes_matrix`."""
+        return self._typed(key, "int_list", lambda v: _split(v, ",", int), default)
+
+    def get_float_list(self, key: str, default=None):
+        """Comma-separated per-filament numbers, e.g. `filament_minimal_purge_on_wipe_tower`."""
+        return self._typed(key, "float_list", lambda v: _split(v, ",", float), default)
+
+    def get_str_list(self, key: str, sep: str = ",", default=None):
+        return self._typed(key, f"str_list{sep}", lambda v: _split(v, sep, str), default)
+
+    def get_percent_list(self, key: str, default=None):
+        """Comma-separated percentages (`100%,90%`) as numbers (`[100.0, 90.0]`)."""
+        return self._typed(key, "percent_list", lambda v: _split(v, ",", _percent), default)
+
+    def get_colors(self, key: str = "filament_colour", default=None):
+        """`#RRGGBB;#RRGGBB;...` as upper-case `#RRGGBB` strings."""
+        return self._typed(key, "colors", _colors, default)
+
+    def metadata(self) -> ScanResult:
+        """The flush/tower metadata of the block, converted by the scan's setters.
+
+        Line indices are those of `line_index`; `transitions` and `tower_bbox`
+        stay empty, the block has no moves.
+        """
+        res = ScanResult()
+        for key, setter in SCAN_KEYS.items():
+            name = key.decode("ascii")
+            value = self.settings.get(name)
+            if value is not None:
+                setter(res, value.encode("utf-8"), self.line_index.get(name, -1))
+        return res
+
+
+def _split(value: str, sep: str, conv):
+    return [conv(x.strip()) for x in value.split(sep) if x.strip() != ""]
+
+
+def _percent(value: str) -> float:
+    return float(value[:-1] if value.endswith("%") else value)
+
+
+def _colors(value: str):
+    out = []
+    for c in split_colours(value):
+        if len(c) != 7 or c[0] != "#":
+            raise ValueError(c)
+        int(c[1:], 16)
+        out.append(c.upper())
+    return out
+
+
+def read_metadata(path) -> ScanResult:
+    """Flush/tower metadata from the CONFIG_BLOCK; full-file scan only as a fallback.
+
+    The block is parsed by `ConfigBlock`; line indices in the result are
+    relative to the block (or the file, for the fallback), and
+    `transitions`/`tower_bbox` are only meaningful for the fallback scan.
+    """
+    block = read_config_block(path)
+    if block is not None:
+        return ConfigBlock.from_lines(block).metadata()
+    return scan_lines(iter_lines(Path(path)))
+
+
+def needs_scaling(path) -> bool:
+    """True if processing would rescale the flush matrix (multiplier present and != 1)."""
+    meta = read_metadata(path)
+    return meta.matrix_nums is not None and meta.flush_mult not in (None, 1.0)
@@ -0,0 +1,186 @@
+"""
+index.py
+Random-access structure index of a G-code file (`GcodeIndex`).
+
+One C-level regex pass over the raw bytes (as in sparse.py) records the
+offsets of every `;LAYER_CHANGE`, `T<n>`, `;TYPE:` and wipe tower start/end
+line, classified with the scan engine's own `T_RE` / `RE_COMMENT`.
+Offsets are kept in sorted arrays, so questions such as "the lines of layer
+412", "every transition into T2" or "the tower extents on layer 30" are a
+bisect plus a slice of the (memory-mapped) buffer instead of a re-parse.
+
+Layers are numbered from 0 in file order; layer n runs from its
+`;LAYER_CHANGE` line to the next one (the last layer ends with the
+EXECUTABLE_BLOCK). Like sparse_scan(), the index expects "\\n" or "\\r\\n"
+line breaks.
+"""
+
+from __future__ import annotations
+
+import mmap
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+from pathlib import Path
+
+from cfs_postproc.blocks import index_blocks, layer_offsets
+from cfs_postproc.scan import RE_COMMENT, T_RE, LineScanner
+
+# Superset of the indexed lines: tool changes, feature types, tower markers
+_MARKERS = rb"TYPE:|WIPE_TOWER|PRIME_TOWER|CP[ \t]|END[ \t]*WIPE"
+_EVENT = rb"[ \t\x0b\x0c]*(?:T[0-9]|;+[ \t]*(?:" + _MARKERS + rb"))"
+RE_EVENT = re.compile(rb"\n" + _EVENT, re.I)
+RE_EVENT_AT_START = re.compile(_EVENT, re.I)
+RE_TYPE = re.compile(rb"\s*;+\s*TYPE:\s*(.*?)\s*$")
+
+
+class GcodeIndex:
+    """Offsets of layers, tool changes, feature types and tower sections in `buf`.
+
+    `buf` is any bytes-like object (typically an mmap, see `open()`); it must
+    stay open for as long as the index is queried.
+    """
+
+    def __init__(self, buf):
+        self.buf = buf
+        size = len(buf)
+        exe = next((b for b in index_blocks(buf) if b.name == "EXECUTABLE"), None)
+        self.body_end = exe.end if exe is not None else size
+        self.layers = array("q", layer_offsets(buf, *((exe.start, exe.end) if exe else (0, size))))
+
+        self.tool_offsets = array("q")  # every T<n> line ...
+        self.tools = array("h")  # ... and its tool
+        self.transitions = []  # (offset, from tool, to tool) for real changes
+        self.transition_offsets = array("q")
+        self._into = {}  # tool -> positions in `transitions`
+        self.type_offsets = array("q")  # every ;TYPE: line ...
+        self.types = []  # ... and its feature name
+        self.tower_starts = array("q")  # first byte after a tower start marker ...
+        self.tower_ends = array("q")  # ... and the offset of its end marker line
+
+        tool = None
+        tower_from = None
+        for start in self._events():
+            nl = buf.find(b"\n", start)
+            end = size if nl < 0 else nl + 1
+            line = bytes(buf[start:end])
+            if line.lstrip()[:1] != b";":
+                m = T_RE.match(line)
+                if m is None:
+                    continue
+                to = int(m.group(1))
+                self.tool_offsets.append(start)
+                self.tools.append(to)
+                if tool is not None and tool != to:
+                    self._into.setdefault(to, []).append(len(self.transitions))
+                    self.transitions.append((start, tool, to))
+                    self.transition_offsets.append(start)
+                tool = to
+                continue
+            m = RE_TYPE.match(line)
+            if m:
+                self.type_offsets.append(start)
+                self.types.append(m.group(1).decode("utf-8", errors="replace"))
+            m = RE_COMMENT.match(line)
+            kind = None if m is None else m.lastgroup
+            if tower_from is None and kind == "start":
+                tower_from = end
+            elif tower_from is not None and kind == "end":
+                self.tower_starts.append(tower_from)
+                self.tower_ends.append(start)
+                tower_from = None
+        if tower_from is not None:
+            self.tower_starts.append(tower_from)
+            self.tower_ends.append(size)
+        self._extents = {}
+
+    @classmethod
+    def open(cls, path) -> GcodeIndex:
+        """Index `path` through a read-only memory map; close() releases it."""
+        with open(Path(path), "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if f.seek(0, 2) else b""
+        return cls(buf)
+
+    def close(self):
+        if isinstance(self.buf, mmap.mmap):
+            self.buf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _events(self):
+        if RE_EVENT_AT_START.match(self.buf):
+            yield 0
+        for m in RE_EVENT.finditer(self.buf):
+            yield m.start() + 1
+
+    # ---------- Layers ----------
+    @property
+    def layer_count(self) -> int:
+        return len(self.layers)
+
+    def layer_span(self, n: int):
+        """Byte range [start, end) of layer `n`."""
+        if not 0 <= n < len(self.layers):
+            raise IndexError(f"layer {n} out of range (0..{len(self.layers) - 1})")
+        end = self.layers[n + 1] if n + 1 < len(self.layers) else self.body_end
+        return self.layers[n], end
+
+    def layer_bytes(self, n: int) -> bytes:
+        start, end = self.layer_span(n)
+        return bytes(self.buf[start:end])
+
+    def layer_lines(self, n: int):
+        """Byte lines of layer `n`, terminators kept."""
+        return self.layer_bytes(n).splitlines(keepends=True)
+
+    def layer_of(self, offset: int):
+        """Layer containing byte `offset`, or None before the first layer."""
+        n = bisect_right(self.layers, offset) - 1
+        return None if n < 0 else n
+
+    # ---------- Tools ----------
+    def tool_at(self, offset: int):
+        """Tool active at byte `offset` (the last T<n> line before it), or None."""
+        k = bisect_right(self.tool_offsets, offset) - 1
+        return None if k < 0 else self.tools[k]
+
+    def transitions_into(self, tool: int):
+        """(offset, from, to) of every real tool change into `tool`, in file order."""
+        return [self.transitions[k] for k in self._into.get(tool, ())]
+
+    def layer_transitions(self, n: int):
+        """(offset, from, to) of the real tool changes in layer `n`."""
+        start, end = self.layer_span(n)
+        offs = self.transition_offsets
+        return self.transitions[bisect_left(offs, start) : bisect_left(offs, end)]
+
+    # ---------- Feature types ----------
+    def type_at(self, offset: int):
+        """Feature name of the last `;TYPE:` line at or before `offset`, or None."""
+        k = bisect_right(self.type_offsets, offset) - 1
+        return None if k < 0 else self.types[k]
+
+    # ---------- Wipe tower ----------
+    def tower_sections(self, n: int | None = None):
+        """Byte ranges of tower section bodies, clipped to layer `n` if given."""
+        if n is None:
+            return list(zip(self.tower_starts, self.tower_ends))
+        start, end = self.layer_span(n)
+        lo = bisect_right(self.tower_ends, start)
+        hi = bisect_left(self.tower_starts, end)
+        return [
+            (max(start, self.tower_starts[k]), min(end, self.tower_ends[k])) for k in range(lo, hi)
+        ]
+
+    def tower_extents(self, n: int):
+        """Tower bounding box (minx, miny, maxx, maxy) on layer `n`, or None."""
+        if n not in self._extents:
+            scanner = LineScanner(in_tower=True)
+            for a, b in self.tower_sections(n):
+                scanner.feed_tower(bytes(self.buf[a:b]))
+            self._extents[n] = scanner.finish().tower_bbox
+        return self._extents[n]
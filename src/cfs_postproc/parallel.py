@@ -0,0 +1,249 @@
+"""
+parallel.py
+Layer-parallel processing of a single file (`--jobs N`).
+
+The only state the scan carries from line to line is the current tool and
+whether a wipe tower section is open; settings are first/last-wins and the
+tower bounding box is a min/max reduction. So the EXECUTABLE_BLOCK is cut at
+`;LAYER_CHANGE` lines into byte-range chunks and a process pool scans every
+chunk on its own. `merge_scans()` then stitches the partial results together
+in file order: a chunk's incoming tool is the last tool of the chunks before
+it, which resolves the transition at its first tool line. A chunk that starts
+inside an open tower section (rare) is re-scanned with that state.
+
+The output is then spliced from the original file as in process_spliced(), or,
+without splicing, every chunk is rewritten by the pool and the results are
+written in order. Inputs with lone "\\r" line breaks are processed serially.
+With `tower_stable_layers` K, the chunks are still measured in full and the
+K-stable cut is applied once to the merged layers, so the result is the
+serial one (a chunk cannot know whether the layers before it were stable).
+"""
+
+from __future__ import annotations
+
+import mmap
+from bisect import bisect_right
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+from pathlib import Path
+
+from cfs_postproc.blocks import RE_LAYER_CHANGE, index_file
+from cfs_postproc.cfs_postproc import (
+    EOL_PROBE,
+    TransitionTemplates,
+    detect_eol,
+    header_bytes,
+    plan_edits,
+    process_file,
+    rewrite_batches,
+    splice_edits,
+)
+from cfs_postproc.scan import LineScanner, ScanResult, layers_bbox, stable_tower_layers
+from cfs_postproc.sparse import plain_line_breaks, sparse_scan
+from cfs_postproc.splice import splice_file
+from cfs_postproc.stages import StageTimer
+from cfs_postproc.stream import write_batches
+
+MIN_CHUNK = 1 << 20  # smaller chunks cost more in pool overhead than they save
+CHUNKS_PER_JOB = 4  # a few chunks per worker evens out uneven layers
+
+
+# A worker's scan of one chunk. A named tuple like blocks.Block: as with
+# ScanResult, keeping `dataclasses` (and `inspect`) off the import path.
+ChunkScan = namedtuple(
+    "ChunkScan",
+    [
+        "start",  # byte range of the chunk
+        "end",
+        "result",  # ScanResult; line indices and offsets relative to the chunk
+        "first_tool",  # (line index, tool) of the first tool line, or None
+        "last_tool",
+        "in_tower_in",  # tower state the chunk was scanned with
+        "in_tower_out",
+    ],
+)
+
+
+def chunk_bounds(buf, blocks, parts: int):
+    """Offsets [0, ..., len(buf)] cutting the EXECUTABLE_BLOCK before `;LAYER_CHANGE` lines."""
+    size = len(buf)
+    exe = next((b for b in blocks if b.name == "EXECUTABLE"), None)
+    start, end = (exe.start, exe.end) if exe is not None else (0, size)
+    step = max(MIN_CHUNK, (end - start) // max(1, parts))
+    bounds = [0]
+    pos = start + step
+    while pos < end:
+        m = RE_LAYER_CHANGE.search(buf, pos - 1, end)
+        if m is None:
+            break
+        cut = m.start() + 1
+        bounds.append(cut)
+        pos = cut + step
+    bounds.append(size)
+    return bounds
+
+
+def scan_chunk(path, start: int, end: int, in_tower: bool = False) -> ChunkScan:
+    """Sparse-scan bytes [start, end) of `path` with no incoming tool."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        scanner = LineScanner(in_tower=in_tower)
+        res = sparse_scan(m[start:end], scanner)
+    return ChunkScan(
+        start, end, res, scanner.first_tool, scanner.current_tool, in_tower, scanner.in_tower
+    )
+
+
+def merge_scans(path, chunks, tower_stable_layers: int | None = None) -> ScanResult:
+    """Combine per-chunk scans (in file order) into the whole-file ScanResult.
+
+    Chunks scanned with the wrong incoming tower state are re-scanned in place.
+    With `tower_stable_layers`, the tower is cut as a serial scan would
+    (see stable_tower_layers()).
+    """
+    res = ScanResult()
+    tool = None
+    in_tower = False
+    line0 = 0
+    layer0 = 0  # layers before the chunk; its layer -1 continues layer0 - 1
+    minx = miny = float("inf")
+    maxx = maxy = float("-inf")
+    for k, c in enumerate(chunks):
+        if c.in_tower_in != in_tower:
+            c = chunks[k] = scan_chunk(path, c.start, c.end, in_tower)
+        r = c.result
+
+        if c.first_tool is not None and tool is not None and tool != c.first_tool[1]:
+            res.transitions.append((line0 + c.first_tool[0], tool, c.first_tool[1]))
+        res.transitions.extend((line0 + i, fr, to) for i, fr, to in r.transitions)
+        if c.last_tool is not None:
+            tool = c.last_tool
+        in_tower = c.in_tower_out
+
+        # First occurrence wins for these ...
+        if res.flush_mult_idx is None and r.flush_mult_idx is not None:
+            res.flush_mult, res.flush_mult_idx = r.flush_mult, line0 + r.flush_mult_idx
+        if res.matrix_idx is None and r.matrix_idx is not None:
+            res.matrix_nums, res.matrix_idx = r.matrix_nums, line0 + r.matrix_idx
+        if res.prime_volume is None:
+            res.prime_volume = r.prime_volume
+        if res.filament_count is None:
+            res.filament_count = r.filament_count
+        # ... the last one for these
+        if r.enable_prime_tower_idx is not None:
+            res.enable_prime_tower = r.enable_prime_tower
+            res.enable_prime_tower_idx = line0 + r.enable_prime_tower_idx
+        if r.wipe_tower_x is not None:
+            res.wipe_tower_x = r.wipe_tower_x
+        if r.wipe_tower_y is not None:
+            res.wipe_tower_y = r.wipe_tower_y
+
+        if r.tower_bbox is not None:
+            minx, miny = min(minx, r.tower_bbox[0]), min(miny, r.tower_bbox[1])
+            maxx, maxy = max(maxx, r.tower_bbox[2]), max(maxy, r.tower_bbox[3])
+        for n, box in r.tower_layers.items():
+            prev = res.tower_layers.get(layer0 + n)
+            if prev is not None:
+                box = (
+                    min(prev[0], box[0]),
+                    min(prev[1], box[1]),
+                    max(prev[2], box[2]),
+                    max(prev[3], box[3]),
+                )
+            res.tower_layers[layer0 + n] = box
+        res.layer_lines.extend(line0 + i for i in r.layer_lines)
+        res.offsets.update((line0 + i, c.start + off) for i, off in r.offsets.items())
+        line0 += r.line_count
+        layer0 += len(r.layer_lines)
+
+    if tower_stable_layers is not None:
+        res.tower_layers = stable_tower_layers(res.tower_layers, tower_stable_layers)
+        res.tower_bbox = layers_bbox(res.tower_layers)
+    elif minx != float("inf"):
+        res.tower_bbox = (minx, miny, maxx, maxy)
+    res.line_count = line0
+    return res
+
+
+def rewrite_chunk(path, start, end, injections, replacements, args, eol) -> bytes:
+    """Rewritten bytes [start, end) of `path`; line indices are relative to the chunk."""
+    with open(path, "rb") as f:
+        f.seek(start)
+        lines = f.read(end - start).splitlines(keepends=True)
+    out = rewrite_batches([lines], injections, replacements, TransitionTemplates(args, eol))
+    return b"".join(chain.from_iterable(out))
+
+
+def _per_chunk(chunks, injections, replacements):
+    """Split injections and replacements by chunk, re-based to chunk line indices."""
+    firsts = []
+    line0 = 0
+    for c in chunks:
+        firsts.append(line0)
+        line0 += c.result.line_count
+    trans = [[] for _ in chunks]
+    repl = [{} for _ in chunks]
+    for idx, fr, to, park in injections:
+        k = bisect_right(firsts, idx) - 1
+        trans[k].append((idx - firsts[k], fr, to, park))
+    for idx, text in replacements.items():
+        k = bisect_right(firsts, idx) - 1
+        repl[k][idx - firsts[k]] = text
+    return trans, repl
+
+
+def process_parallel(
+    infile, outfile, args, jobs: int, splice: bool = True, timer: StageTimer | None = None
+):
+    """process_file() with the scan (and, without `splice`, the rewrite) spread over `jobs`."""
+    timer = timer if timer is not None else StageTimer()
+    path = Path(infile)
+    size = path.stat().st_size
+    if size == 0:
+        return process_file(infile, outfile, args, splice, timer=timer)
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        if not plain_line_breaks(buf):
+            return process_file(infile, outfile, args, splice, timer=timer)
+        bounds = chunk_bounds(buf, index_file(path), jobs * CHUNKS_PER_JOB)
+        eol = detect_eol(buf[:EOL_PROBE])
+
+        stable = getattr(args, "tower_stable_layers", None)
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            with timer.stage("scan", size) as st:
+                chunks = list(
+                    pool.map(
+                        scan_chunk,
+                        repeat(path),
+                        bounds[:-1],
+                        bounds[1:],
+                        repeat(False),
+                    )
+                )
+                scan = merge_scans(path, chunks, stable)
+                st.lines = scan.line_count
+            with timer.stage("plan", lines=len(scan.transitions)):
+                injections, replacements, hdr, summary = plan_edits(scan, args)
+            if splice:
+                with timer.stage("render", lines=len(injections)):
+                    edits = splice_edits(buf, scan, injections, replacements, args, eol)
+            else:
+                trans, repl = _per_chunk(chunks, injections, replacements)
+                parts = pool.map(
+                    rewrite_chunk,
+                    repeat(path),
+                    bounds[:-1],
+                    bounds[1:],
+                    trans,
+                    repl,
+                    repeat(args),
+                    repeat(eol),
+                )
+                with timer.stage("rewrite+write") as st:
+                    write_batches(Path(outfile), header_bytes(hdr, eol), ([p] for p in parts))
+                    st.nbytes = Path(outfile).stat().st_size
+
+    if splice:
+        with timer.stage("write") as st:
+            splice_file(path, Path(outfile), header_bytes(hdr, eol), edits)
+            st.nbytes = Path(outfile).stat().st_size
+    return hdr, summary
@@ -0,0 +1,486 @@
+"""
+scan.py
+Single-pass scan engine for cfs_postproc.
+
+One traversal of the G-code lines collects everything the rewrite stage needs:
+- flush metadata (`flush_multiplier`, `flush_volumes_matrix`, `prime_volume`,
+  `enable_prime_tower`, `wipe_tower_x` / `wipe_tower_y`, the number of
+  `filament_colour` entries),
+- the wipe/prime tower bounding box (fallback park point),
+- every real tool transition (from != to) with its line index.
+
+Lines are dispatched on their first non-blank byte, so only `T` lines pay for
+`T_RE` and only comment lines for `RE_COMMENT`, a single alternation that
+classifies a comment as a `; key = value` setting or a tower start/end marker
+in one C-level match. Settings are looked up in `SCAN_KEYS`, so the number of
+keys does not affect per-line cost.
+
+The scanner works on raw `bytes` lines (terminators may be included); nothing
+is decoded. `scan_lines()` also accepts `str` lines for convenience.
+"""
+
+from __future__ import annotations
+
+import re
+from array import array
+from math import isqrt
+
+# ---------- Regexes ----------
+RE_FLOAT_VALUE = re.compile(rb"[0-9]*\.?[0-9]+")
+RE_MATRIX_VALUE = re.compile(rb"[0-9,\s]+")
+RE_INT_VALUE = re.compile(rb"[0-9]+")
+RE_BOOL_VALUE = re.compile(rb"[01]")
+RE_COORD_VALUE = re.compile(rb"[0-9.-]+")
+
+# Wipe/prime tower section markers (case-insensitive, after `;`-comment leaders)
+WT_START_MARKERS = (
+    rb"WIPE_TOWER_START\b",
+    rb"PRIME_TOWER_START\b",
+    rb"CP\s+WIPE_TOWER\s*START\b",
+    rb"TYPE:\s*WIPE\s*TOWER\b",
+)
+WT_END_MARKERS = (
+    rb"WIPE_TOWER_END\b",
+    rb"PRIME_TOWER_END\b",
+    rb"CP\s+WIPE_TOWER\s*END\b",
+    rb"END\s*WIPE\s*TOWER\b",
+)
+
+# Patterns the scan itself does not use, compiled on first access (see __getattr__):
+# RE_SETTING, a `; key = value` slicer setting, and one pattern per tower marker
+_LAZY_PATTERNS = {
+    "RE_SETTING": lambda: re.compile(rb"^\s*;\s*([A-Za-z_]\w*)\s*=\s*(.*?)\s*$"),
+    "WT_STARTS": lambda: [re.compile(rb"^\s*;+\s*" + p, re.I) for p in WT_START_MARKERS],
+    "WT_ENDS": lambda: [re.compile(rb"^\s*;+\s*" + p, re.I) for p in WT_END_MARKERS],
+}
+
+
+def __getattr__(name):
+    try:
+        make = _LAZY_PATTERNS[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = globals()[name] = make()
+    return value
+
+
+# Every comment line the scan acts on, in one match: a `; key = value` setting
+# (as RE_SETTING), a `;LAYER_CHANGE`, a tower start or a tower end. `lastgroup`
+# names the kind ("value", "layer", "start" or "end").
+RE_COMMENT = re.compile(
+    rb"\s*;(?:\s*(?P<key>[A-Za-z_]\w*)\s*=\s*(?P<value>.*?)\s*$|[ \t]*(?P<layer>LAYER_CHANGE)\b"
+    rb"|(?i:;*\s*(?:(?P<start>"
+    + b"|".join(WT_START_MARKERS)
+    + rb")|(?P<end>"
+    + b"|".join(WT_END_MARKERS)
+    + rb"))))"
+)
+
+MAX_TOOLS = 16  # four CFS units of four slots: T0..T15
+T_RE = re.compile(rb"^\s*T(1[0-5]|[0-9])\s*(?:;.*)?$")
+
+TOWER_STABLE_EPS = 0.01  # mm; layer footprints closer than this count as the same
+
+RE_X = re.compile(rb"\bX(-?\d+\.?\d*)")
+RE_Y = re.compile(rb"\bY(-?\d+\.?\d*)")
+# The first X / Y word of every line of a block: RE_X / RE_Y .search() per line, in bulk
+RE_X_LINES = re.compile(rb"^.*?\bX(-?\d+\.?\d*)", re.M)
+RE_Y_LINES = re.compile(rb"^.*?\bY(-?\d+\.?\d*)", re.M)
+
+NUMPY_MIN_VALUES = 512  # below this, array setup costs more than the C reduction saves
+_numpy = None  # the numpy module once looked up, False if it is not installed
+
+
+def _get_numpy():
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy
+
+
+def _min_max(values, use_numpy: bool):
+    if use_numpy and len(values) >= NUMPY_MIN_VALUES:
+        np = _get_numpy()
+        if np:
+            # float() per value still, but min/max run in C; np.array(values).astype()
+            # (bytes -> float64 inside NumPy) measured slower than both
+            a = np.fromiter(map(float, values), np.float64, len(values))
+            return float(a.min()), float(a.max())
+    v = [float(x) for x in values]
+    return min(v), max(v)
+
+
+def block_extents(data: bytes, use_numpy: bool = True):
+    """(minx, miny, maxx, maxy) of the first X and Y word on each line of `data`.
+
+    An axis without values gives (inf, -inf). The coordinates are found with one
+    findall() per axis and converted through float(); with NumPy installed
+    (optional) large blocks are reduced as arrays instead of Python lists.
+    """
+    inf = float("inf")
+    xs = RE_X_LINES.findall(data)
+    ys = RE_Y_LINES.findall(data)
+    minx, maxx = _min_max(xs, use_numpy) if xs else (inf, -inf)
+    miny, maxy = _min_max(ys, use_numpy) if ys else (inf, -inf)
+    return minx, miny, maxx, maxy
+
+
+def parse_matrix(payload):
+    """The N×N flush matrix in `payload` (N = 1..MAX_TOOLS) as a row-major array, or None."""
+    if isinstance(payload, str):
+        payload = payload.encode("utf-8")
+    nums = [n for n in payload.replace(b" ", b"").split(b",") if n != b""]
+    n = isqrt(len(nums))
+    if not 0 < n <= MAX_TOOLS or n * n != len(nums):
+        return None
+    try:
+        return array("l", [int(x) for x in nums])
+    except (ValueError, OverflowError):
+        return None
+
+
+class ScanResult:
+    """Everything the rewrite stage needs from a scan.
+
+    A plain class rather than a dataclass: `dataclasses` pulls in `inspect`,
+    which alone costs about as much start-up time as the rest of the engine.
+    """
+
+    def __init__(
+        self,
+        flush_mult: float | None = None,
+        flush_mult_idx: int | None = None,
+        matrix_idx: int | None = None,
+        matrix_nums: array | None = None,
+        prime_volume: int | None = None,
+        enable_prime_tower: int = 0,
+        enable_prime_tower_idx: int | None = None,
+        wipe_tower_x: float | None = None,
+        wipe_tower_y: float | None = None,
+        filament_count: int | None = None,
+        tower_bbox: tuple[float, float, float, float] | None = None,
+        transitions: list[tuple[int, int, int]] | None = None,
+        line_count: int = 0,
+        layer_lines: list[int] | None = None,
+        tower_layers: dict[int, tuple[float, float, float, float]] | None = None,
+        offsets: dict[int, int] | None = None,
+    ):
+        self.flush_mult = flush_mult
+        self.flush_mult_idx = flush_mult_idx
+        self.matrix_idx = matrix_idx
+        self.matrix_nums = matrix_nums  # row-major N×N, array("l")
+        self.prime_volume = prime_volume
+        self.enable_prime_tower = enable_prime_tower  # Default to 0 (disabled)
+        self.enable_prime_tower_idx = enable_prime_tower_idx
+        self.wipe_tower_x = wipe_tower_x
+        self.wipe_tower_y = wipe_tower_y
+        self.filament_count = filament_count  # entries of `filament_colour`
+        self.tower_bbox = tower_bbox  # minx, miny, maxx, maxy
+        # (line index, from tool, to tool) for every real transition, in file order
+        self.transitions = [] if transitions is None else transitions
+        self.line_count = line_count
+        # line index of every `;LAYER_CHANGE`; layer n starts there (-1 is before the first)
+        self.layer_lines = [] if layer_lines is None else layer_lines
+        # layer -> tower bounding box on that layer, for layers with tower moves
+        self.tower_layers = {} if tower_layers is None else tower_layers
+        # line index -> byte offset of the line start, for lines a byte-level scan
+        # decoded (not compared, not shown)
+        self.offsets = {} if offsets is None else offsets
+
+    def _fields(self):
+        return {k: v for k, v in vars(self).items() if k != "offsets"}
+
+    def __eq__(self, other):
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self._fields() == other._fields()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"ScanResult({', '.join(f'{k}={v!r}' for k, v in self._fields().items())})"
+
+    @property
+    def tool_count(self):
+        """N of the N×N matrix, else the number of filament colours, else None."""
+        if self.matrix_nums is not None:
+            return isqrt(len(self.matrix_nums))
+        return self.filament_count
+
+    @property
+    def tower_center(self):
+        if self.tower_bbox is None:
+            return None
+        minx, miny, maxx, maxy = self.tower_bbox
+        return ((minx + maxx) / 2.0, (miny + maxy) / 2.0)
+
+
+def _float_or_none(s: bytes):
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def _set_flush_mult(res: ScanResult, value: bytes, i: int):
+    if res.flush_mult_idx is None and RE_FLOAT_VALUE.fullmatch(value):
+        res.flush_mult = float(value)
+        res.flush_mult_idx = i
+
+
+def _set_matrix(res: ScanResult, value: bytes, i: int):
+    if res.matrix_idx is None and RE_MATRIX_VALUE.fullmatch(value):
+        parsed = parse_matrix(value)
+        if parsed is not None:
+            res.matrix_idx = i
+            res.matrix_nums = parsed
+
+
+def _set_prime_volume(res: ScanResult, value: bytes, i: int):
+    if res.prime_volume is None and RE_INT_VALUE.fullmatch(value):
+        res.prime_volume = int(value)
+
+
+def _set_enable_prime_tower(res: ScanResult, value: bytes, i: int):
+    if RE_BOOL_VALUE.fullmatch(value):
+        res.enable_prime_tower = int(value)
+        res.enable_prime_tower_idx = i
+
+
+def _set_wipe_tower_x(res: ScanResult, value: bytes, i: int):
+    m = RE_COORD_VALUE.match(value)
+    if m:
+        res.wipe_tower_x = _float_or_none(m.group(0))
+
+
+def _set_wipe_tower_y(res: ScanResult, value: bytes, i: int):
+    m = RE_COORD_VALUE.match(value)
+    if m:
+        res.wipe_tower_y = _float_or_none(m.group(0))
+
+
+def split_colours(value):
+    """The non-empty, stripped `;`-separated entries of a `filament_colour` value.
+
+    Works on `bytes` and `str` alike; config.ConfigBlock.get_colors() validates
+    the same entries the scan counts.
+    """
+    sep = b";" if isinstance(value, bytes) else ";"
+    return [c for c in (c.strip() for c in value.split(sep)) if c]
+
+
+def _set_filament_colour(res: ScanResult, value: bytes, i: int):
+    if res.filament_count is None:
+        res.filament_count = len(split_colours(value)) or None
+
+
+# Settings the scan acts on: lower-cased key -> setter(result, value, line index)
+SCAN_KEYS = {
+    b"flush_multiplier": _set_flush_mult,
+    b"flush_volumes_matrix": _set_matrix,
+    b"prime_volume": _set_prime_volume,
+    b"enable_prime_tower": _set_enable_prime_tower,
+    b"wipe_tower_x": _set_wipe_tower_x,
+    b"wipe_tower_y": _set_wipe_tower_y,
+    b"filament_colour": _set_filament_colour,
+}
+
+
+def _complete(box) -> bool:
+    return box[0] != float("inf") and box[1] != float("inf")
+
+
+def _same_footprint(box, last) -> bool:
+    return last is not None and all(abs(a - b) <= TOWER_STABLE_EPS for a, b in zip(box, last))
+
+
+def stable_tower_layers(tower_layers, k: int):
+    """The part of `tower_layers` (layer -> box, in layer order) measured with K = `k`.
+
+    Layers up to and including the K-th consecutive one with the same
+    footprint; LineScanner stops measuring there, and merge_scans() applies
+    the same cut to the layers of independently scanned chunks.
+    """
+    out = {}
+    stable = 0
+    last = None
+    for n, box in tower_layers.items():
+        out[n] = box
+        stable = stable + 1 if _same_footprint(box, last) else 1
+        last = box
+        if stable >= k:
+            break
+    return out
+
+
+def layers_bbox(tower_layers):
+    """Bounding box of all boxes in `tower_layers`, or None if there are none."""
+    boxes = tower_layers.values()
+    if not boxes:
+        return None
+    return (
+        min(b[0] for b in boxes),
+        min(b[1] for b in boxes),
+        max(b[2] for b in boxes),
+        max(b[3] for b in boxes),
+    )
+
+
+class LineScanner:
+    """Resumable single-pass scanner.
+
+    `feed()` may be called repeatedly with consecutive (or deliberately skipped)
+    runs of lines; `start` is the global index of the first line of each run.
+    Tool and tower state carry over between calls. `finish()` returns the result.
+
+    `current_tool` / `in_tower` seed the state for scanning a slice of a file;
+    `first_tool` records the (line index, tool) of the first tool line seen.
+
+    The tower bounding box is collected per layer. With `tower_stable_layers`
+    K, tower moves are no longer parsed once K consecutive layers had the same
+    footprint (`tower_done`); later layers are assumed to keep it.
+    """
+
+    def __init__(
+        self,
+        current_tool: int | None = None,
+        in_tower: bool = False,
+        tower_stable_layers: int | None = None,
+    ):
+        self.res = ScanResult()
+        self.current_tool = current_tool
+        self.in_tower = in_tower
+        self.first_tool = None
+        self.layer = -1
+        self.tower_stable_layers = tower_stable_layers
+        self.tower_done = False
+        self._boxes = {}  # layer -> (minx, miny, maxx, maxy), possibly with infinities
+        self._last_box = None
+        self._stable = 0
+        # Bounding box of the current layer
+        self.minx = self.miny = float("inf")
+        self.maxx = self.maxy = float("-inf")
+
+    def _close_layer(self, layer: int, box):
+        self._boxes[layer] = box
+        if self.tower_stable_layers is None or not _complete(box):
+            return
+        self._stable = self._stable + 1 if _same_footprint(box, self._last_box) else 1
+        self._last_box = box
+        if self._stable >= self.tower_stable_layers:
+            self.tower_done = True
+
+    def feed(self, lines, start: int = 0) -> LineScanner:
+        res = self.res
+        transitions = res.transitions
+        layer_lines = res.layer_lines
+        current_tool = self.current_tool
+        in_tower = self.in_tower
+        tower_done = self.tower_done
+        layer = self.layer
+        minx, miny, maxx, maxy = self.minx, self.miny, self.maxx, self.maxy
+        inf = float("inf")
+
+        n = 0
+        for i, ln in enumerate(lines, start):
+            n += 1
+            c = ln.lstrip()[:1]
+            if c == b";":
+                m = RE_COMMENT.match(ln)
+                if m is not None:
+                    kind = m.lastgroup
+                    if kind == "value":
+                        setter = SCAN_KEYS.get(m.group("key").lower())
+                        if setter is not None:
+                            setter(res, m.group("value"), i)
+                    elif kind == "layer":
+                        if minx != inf or miny != inf:
+                            self._close_layer(layer, (minx, miny, maxx, maxy))
+                            tower_done = self.tower_done
+                            minx = miny = inf
+                            maxx = maxy = -inf
+                        layer += 1
+                        layer_lines.append(i)
+                    elif kind == "start":
+                        in_tower = True
+                        continue
+                    elif in_tower:
+                        in_tower = False
+                        continue
+            elif c == b"T":
+                mt = T_RE.match(ln)
+                if mt:
+                    to_tool = int(mt.group(1))
+                    if self.first_tool is None:
+                        self.first_tool = (i, to_tool)
+                    if current_tool is not None and current_tool != to_tool:
+                        transitions.append((i, current_tool, to_tool))
+                    current_tool = to_tool
+            if in_tower and not tower_done:
+                mx = RE_X.search(ln)
+                if mx:
+                    x = float(mx.group(1))
+                    minx = min(minx, x)
+                    maxx = max(maxx, x)
+                my = RE_Y.search(ln)
+                if my:
+                    y = float(my.group(1))
+                    miny = min(miny, y)
+                    maxy = max(maxy, y)
+
+        res.line_count += n
+        self.current_tool = current_tool
+        self.in_tower = in_tower
+        self.layer = layer
+        self.minx, self.miny, self.maxx, self.maxy = minx, miny, maxx, maxy
+        return self
+
+    def feed_tower(self, data: bytes) -> LineScanner:
+        """Add the X/Y extents of `data`, lines inside the open tower section.
+
+        Equivalent to feed() for lines without markers, settings, layer or tool
+        changes (what sparse_scan() leaves between candidates), but in bulk; the
+        lines are not counted.
+        """
+        if not self.tower_done:
+            minx, miny, maxx, maxy = block_extents(data)
+            self.minx, self.miny = min(self.minx, minx), min(self.miny, miny)
+            self.maxx, self.maxy = max(self.maxx, maxx), max(self.maxy, maxy)
+        return self
+
+    def finish(self) -> ScanResult:
+        res = self.res
+        inf = float("inf")
+        if self.minx != inf or self.miny != inf:
+            self._close_layer(self.layer, (self.minx, self.miny, self.maxx, self.maxy))
+            self.minx = self.miny = inf
+            self.maxx = self.maxy = -inf
+        res.tower_layers = {k: b for k, b in sorted(self._boxes.items()) if _complete(b)}
+        if self.tower_stable_layers is not None:
+            res.tower_layers = stable_tower_layers(res.tower_layers, self.tower_stable_layers)
+            res.tower_bbox = layers_bbox(res.tower_layers)
+            return res
+        boxes = self._boxes.values()
+        minx = min((b[0] for b in boxes), default=inf)
+        miny = min((b[1] for b in boxes), default=inf)
+        if minx != inf and miny != inf:
+            res.tower_bbox = (minx, miny, max(b[2] for b in boxes), max(b[3] for b in boxes))
+        return res
+
+
+def _as_bytes(lines):
+    for ln in lines:
+        yield ln.encode("utf-8") if isinstance(ln, str) else ln
+
+
+def scan_lines(lines) -> ScanResult:
+    """Collect metadata, tower bounds and tool transitions in one traversal."""
+    return LineScanner().feed(_as_bytes(lines)).finish()
+
+
+def find_tower_center(lines):
+    return scan_lines(lines).tower_center
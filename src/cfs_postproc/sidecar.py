@@ -0,0 +1,154 @@
+"""
+sidecar.py
+Persisted scan results (`<input>.idx`) for fast re-processing.
+
+Changing only injection parameters (`--precut-mm`, the park point, ...) does
+not move any tool change, so the scan of an unchanged input can be reused.
+With `--index` the spliced path writes a JSON sidecar next to the input
+holding everything plan_edits() and splice_edits() need: the byte offset and
+from -> to of every real tool change, the offsets of the rewritten setting
+lines, the flush/tower metadata, the layer lines and the per-layer tower
+bounding boxes. For tooling it also records the `;LAYER_CHANGE` offsets, the
+CONFIG_BLOCK byte range and the SHA-256 of the input.
+
+A sidecar is only trusted while the input's size and mtime match the ones it
+was written for and every stored offset still starts the line it recorded (a
+tool change to the same tool, or the same setting); otherwise the file is
+scanned again and the sidecar replaced. The offset check is what catches a
+same-size rewrite that the mtime misses (coarse FAT timestamps, a reset mtime).
+"""
+
+from __future__ import annotations
+
+import os
+from array import array
+from pathlib import Path
+
+from cfs_postproc.blocks import index_blocks, layer_offsets
+from cfs_postproc.cache import digest_file
+from cfs_postproc.scan import RE_COMMENT, T_RE, ScanResult
+
+SIDECAR_SUFFIX = ".idx"
+SIDECAR_VERSION = 4
+
+# ScanResult fields stored as-is
+_FIELDS = (
+    "flush_mult",
+    "flush_mult_idx",
+    "matrix_idx",
+    "matrix_nums",
+    "prime_volume",
+    "enable_prime_tower",
+    "enable_prime_tower_idx",
+    "wipe_tower_x",
+    "wipe_tower_y",
+    "filament_count",
+    "line_count",
+    "layer_lines",
+)
+
+
+def sidecar_path(path) -> Path:
+    return Path(f"{path}{SIDECAR_SUFFIX}")
+
+
+def save_index(path, buf, scan: ScanResult, tower_stable_layers: int | None = None):
+    """Write the sidecar of `path` (whose contents are `buf`) for `scan`."""
+    st = os.stat(path)
+    blocks = index_blocks(buf)
+    config = next((b for b in blocks if b.name == "CONFIG"), None)
+    exe = next((b for b in blocks if b.name == "EXECUTABLE"), None)
+    lines = {i for i, _, _ in scan.transitions}
+    lines.update(i for i in (scan.flush_mult_idx, scan.matrix_idx) if i is not None)
+    doc = {
+        "version": SIDECAR_VERSION,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "sha256": digest_file(path),
+        **{k: getattr(scan, k) for k in _FIELDS},
+        "matrix_nums": None if scan.matrix_nums is None else scan.matrix_nums.tolist(),
+        "tower_bbox": scan.tower_bbox,
+        "tower_layers": [[n, *box] for n, box in scan.tower_layers.items()],
+        "tower_stable_layers": tower_stable_layers,
+        # [line index, byte offset, from tool, to tool]
+        "tool_changes": [[i, scan.offsets[i], fr, to] for i, fr, to in scan.transitions],
+        "line_offsets": {str(i): scan.offsets[i] for i in sorted(lines)},
+        "layers": layer_offsets(buf, *((exe.start, exe.end) if exe else (0, len(buf)))),
+        "config_block": None if config is None else [config.start, config.end],
+    }
+    dst = sidecar_path(path)
+    tmp = dst.with_name(dst.name + ".tmp")
+    import json  # imported on use: runs without --index skip it
+
+    tmp.write_text(json.dumps(doc, separators=(",", ":")), encoding="utf-8")
+    tmp.replace(dst)
+
+
+def read_index(path):
+    """The sidecar document of `path`, or None if missing, unreadable or stale."""
+    import json
+
+    try:
+        with open(sidecar_path(path), encoding="utf-8") as f:
+            doc = json.load(f)
+        st = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(doc, dict) or doc.get("version") != SIDECAR_VERSION:
+        return None
+    if doc.get("size") != st.st_size or doc.get("mtime_ns") != st.st_mtime_ns:
+        return None
+    return doc
+
+
+def _line_at(buf, offset: int):
+    """The line of `buf` starting at `offset`, or None if no line starts there."""
+    if not 0 <= offset < len(buf) or (offset and buf[offset - 1] != 0x0A):
+        return None
+    end = buf.find(b"\n", offset)
+    return buf[offset : len(buf) if end < 0 else end + 1]
+
+
+def _setting_at(buf, offset: int):
+    line = _line_at(buf, offset)
+    m = None if line is None else RE_COMMENT.match(line)
+    return m.group("key").lower() if m and m.lastgroup == "value" else None
+
+
+def _offsets_current(buf, res: ScanResult) -> bool:
+    """True if every stored offset of `res` still starts the line it was recorded for."""
+    for i, _, to in res.transitions:
+        line = _line_at(buf, res.offsets[i])
+        m = None if line is None else T_RE.match(line)
+        if m is None or int(m.group(1)) != to:
+            return False
+    for i, key in (
+        (res.flush_mult_idx, b"flush_multiplier"),
+        (res.matrix_idx, b"flush_volumes_matrix"),
+    ):
+        if i is not None and _setting_at(buf, res.offsets[i]) != key:
+            return False
+    return True
+
+
+def load_index(path, buf, tower_stable_layers: int | None = None) -> ScanResult | None:
+    """ScanResult stored in a current sidecar of `path` (offsets for edited lines only).
+
+    `buf` holds the contents of `path`; the stored offsets are checked against it.
+    """
+    doc = read_index(path)
+    if doc is None or doc.get("tower_stable_layers") != tower_stable_layers:
+        return None
+    try:
+        res = ScanResult(**{k: doc[k] for k in _FIELDS})
+        if res.matrix_nums is not None:
+            res.matrix_nums = array("l", res.matrix_nums)
+        res.tower_bbox = None if doc["tower_bbox"] is None else tuple(doc["tower_bbox"])
+        res.tower_layers = {n: tuple(box) for n, *box in doc["tower_layers"]}
+        res.transitions = [(i, fr, to) for i, _, fr, to in doc["tool_changes"]]
+        res.offsets = {int(i): off for i, off in doc["line_offsets"].items()}
+        if not _offsets_current(buf, res):
+            return None
+    except (KeyError, TypeError, ValueError):
+        return None
+    return res
@@ -0,0 +1,109 @@
+"""
+sparse.py
+Sparse marker search over raw bytes (memory-mapped files or in-memory buffers).
+
+Only a tiny fraction of G-code lines matter to the post-processor: `T<n>`
+lines, `;LAYER_CHANGE` and tower start/end markers and a handful of
+`; key = value` settings.
+`sparse_scan()` finds those candidate lines with one C-level regex over the
+buffer and slices out only them. Candidates are fed to the regular
+`LineScanner`, so results are identical to `scan_lines()`. The only other
+bytes read are the runs of lines inside a wipe tower section, whose X/Y
+coordinates make up the per-layer tower bounding boxes (until the scanner's
+`tower_done`); they are extracted in bulk by `LineScanner.feed_tower()`.
+
+Line indices are derived by counting "\\n", which matches `bytes.splitlines()`
+only when there is no lone "\\r" line break; `plain_line_breaks()` checks that,
+and `scan_file()` falls back to a streaming line scan otherwise.
+"""
+
+from __future__ import annotations
+
+import mmap
+import re
+from pathlib import Path
+
+from cfs_postproc.scan import SCAN_KEYS, LineScanner, ScanResult, scan_lines
+from cfs_postproc.stream import iter_lines
+
+_KEYS = b"|".join(re.escape(k) for k in SCAN_KEYS)
+# Superset of the lines LineScanner acts on: tool changes, scanned settings, layer
+# changes, tower markers
+_CANDIDATE = (
+    rb"[ \t\x0b\x0c]*(?:T[0-9]|;+[ \t]*(?:(?:"
+    + _KEYS
+    + rb")[ \t]*=|LAYER_CHANGE|WIPE_TOWER|PRIME_TOWER|CP[ \t]|TYPE:[ \t]*WIPE|END[ \t]*WIPE))"
+)
+RE_CANDIDATE = re.compile(rb"\n" + _CANDIDATE, re.I)
+RE_CANDIDATE_AT_START = re.compile(_CANDIDATE, re.I)
+
+RE_LONE_CR = re.compile(rb"\r(?!\n)")
+COUNT_CHUNK = 1 << 20
+
+
+def plain_line_breaks(buf) -> bool:
+    """True if "\\n" (optionally preceded by "\\r") is the only line break in `buf`."""
+    return buf.find(b"\r") < 0 or RE_LONE_CR.search(buf) is None
+
+
+def count_newlines(buf, start: int, end: int) -> int:
+    """Number of "\\n" in buf[start:end], copying at most COUNT_CHUNK bytes at a time."""
+    n = 0
+    for a in range(start, end, COUNT_CHUNK):
+        n += buf[a : min(end, a + COUNT_CHUNK)].count(b"\n")
+    return n
+
+
+def iter_candidates(buf):
+    """Byte offsets of the candidate line starts in `buf`, in file order."""
+    if RE_CANDIDATE_AT_START.match(buf):
+        yield 0
+    for m in RE_CANDIDATE.finditer(buf):
+        yield m.start() + 1
+
+
+def sparse_scan(buf, scanner: LineScanner | None = None) -> ScanResult:
+    """scan_lines() equivalent that only looks at candidate and in-tower lines.
+
+    `buf` must satisfy plain_line_breaks(). The byte offset of every candidate
+    line (tool changes and settings included) is recorded in `offsets`. A
+    seeded `scanner` may be passed to scan a slice that starts mid-file.
+    """
+    size = len(buf)
+    if scanner is None:
+        scanner = LineScanner()
+    offsets = scanner.res.offsets
+    idx = 0  # line index of `pos`
+    pos = 0
+    # offset of the first line inside an open tower
+    tower_from = 0 if scanner.in_tower else None
+    for start in iter_candidates(buf):
+        if tower_from is not None:
+            scanner.feed_tower(bytes(buf[tower_from:start]))
+            tower_from = None
+        idx += count_newlines(buf, pos, start)
+        nl = buf.find(b"\n", start)
+        end = size if nl < 0 else nl + 1
+        scanner.feed([bytes(buf[start:end])], idx)
+        offsets[idx] = start
+        pos = start
+        if scanner.in_tower and not scanner.tower_done and nl >= 0:
+            tower_from = nl + 1
+    if tower_from is not None:
+        scanner.feed_tower(bytes(buf[tower_from:size]))
+
+    res = scanner.finish()
+    idx += count_newlines(buf, pos, size)
+    res.line_count = idx + (1 if size and buf[size - 1 : size] != b"\n" else 0)
+    return res
+
+
+def scan_file(path) -> ScanResult:
+    """Scan `path` through a read-only memory map; streaming line scan as fallback."""
+    path = Path(path)
+    if path.stat().st_size == 0:
+        return scan_lines([])
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m:
+        if plain_line_breaks(m):
+            return sparse_scan(m)
+    return scan_lines(iter_lines(path))
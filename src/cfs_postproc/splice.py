@@ -0,0 +1,112 @@
+"""
+splice.py
+Zero-copy output assembly.
+
+Apart from the rewritten flush comments and the injected pre-cut blocks, the
+output is a verbatim copy of the input. `splice_file()` writes the header and
+the replacement snippets from Python and lets the kernel copy every untouched
+byte range in between: `os.copy_file_range()` where available, `os.sendfile()`
+as the first fallback and plain buffered `lseek`/`read`/`write` as the last one,
+which every platform has.
+
+A strategy that fails (e.g. EXDEV for one cross-filesystem output) is only
+dropped for the rest of that splice_file() call. The process remembers a
+strategy as unsupported only when the platform lacks it: no `os` function,
+or ENOSYS from the kernel. Concurrent calls therefore never affect each other.
+"""
+
+from __future__ import annotations
+
+import errno
+import os
+from pathlib import Path
+
+COPY_CHUNK = 1 << 30  # per-syscall cap for the kernel copy paths
+BUFFERED_CHUNK = 1 << 20
+
+# Copy strategies in order of preference
+_STRATEGIES = ("copy_file_range", "sendfile", "buffered")
+_UNSUPPORTED = set()  # kernel copy strategies this platform lacks (ENOSYS)
+
+
+def _copy_file_range(src: int, dst: int, offset: int, count: int) -> int:
+    return os.copy_file_range(src, dst, min(count, COPY_CHUNK), offset)
+
+
+def _sendfile(src: int, dst: int, offset: int, count: int) -> int:
+    return os.sendfile(dst, src, offset, min(count, COPY_CHUNK))
+
+
+def _buffered(src: int, dst: int, offset: int, count: int) -> int:
+    # Not os.pread(): it is Unix-only, and this is the path for platforms without the others
+    os.lseek(src, offset, os.SEEK_SET)
+    data = os.read(src, min(count, BUFFERED_CHUNK))
+    _write_all(dst, data)
+    return len(data)
+
+
+_COPIERS = {"copy_file_range": _copy_file_range, "sendfile": _sendfile, "buffered": _buffered}
+
+
+def _write_all(fd: int, data: bytes):
+    view = memoryview(data)
+    while view:
+        view = view[os.write(fd, view) :]
+
+
+def copy_strategies():
+    """Strategies worth trying on this platform, in order of preference (a new list)."""
+    return [
+        name
+        for name in _STRATEGIES
+        if name == "buffered" or (hasattr(os, name) and name not in _UNSUPPORTED)
+    ]
+
+
+def copy_range(src: int, dst: int, offset: int, count: int, strategies=None):
+    """Append `count` bytes of `src` starting at `offset` to the current position of `dst`.
+
+    `strategies` (default: copy_strategies()) is the caller's list of
+    strategies still to use; a failing one is removed from it.
+    """
+    if strategies is None:
+        strategies = copy_strategies()
+    while count > 0:
+        name = strategies[0]
+        try:
+            n = _COPIERS[name](src, dst, offset, count)
+        except OSError as e:
+            if name == "buffered":
+                raise
+            # e.g. EXDEV on older kernels, ENOSYS/EINVAL on unsupported filesystems.
+            # Nothing was written, so retry the same range with the next strategy.
+            if e.errno == errno.ENOSYS:
+                _UNSUPPORTED.add(name)
+            strategies.remove(name)
+            continue
+        if n == 0:
+            raise OSError(f"unexpected end of input at offset {offset}")
+        offset += n
+        count -= n
+
+
+def splice_file(src: Path, dst: Path, head: bytes, edits, tail: bytes = b""):
+    """Atomically write `head`, then `src` with `edits` applied, then `tail`.
+
+    `edits` are non-overlapping `(start, end, replacement)` byte ranges of `src`,
+    sorted by `start`; everything outside them is copied verbatim.
+    """
+    tmp = dst.with_suffix(dst.suffix + ".tmp")
+    with open(src, "rb") as fin, open(tmp, "wb") as fout:
+        size = os.fstat(fin.fileno()).st_size
+        sfd, dfd = fin.fileno(), fout.fileno()
+        strategies = copy_strategies()  # demoted for this output only
+        _write_all(dfd, head)
+        pos = 0
+        for start, end, replacement in edits:
+            copy_range(sfd, dfd, pos, start - pos, strategies)
+            _write_all(dfd, replacement)
+            pos = end
+        copy_range(sfd, dfd, pos, size - pos, strategies)
+        _write_all(dfd, tail)
+    tmp.replace(dst)
@@ -0,0 +1,121 @@
+"""
+stages.py
+Per-stage wall time and throughput of a run (`--profile`).
+
+process() hands a `StageTimer` down the pipeline; every step runs inside
+`with timer.stage(name, nbytes, lines):` and the finished `Stage` records its
+wall time next to the bytes and lines it handled, so MB/s per stage falls out.
+Stages are coarse (a handful per file), so they are always recorded; the
+report carries them and `--profile` prints them to stderr.
+
+Set `CFS_POSTPROC_PROFILE` to a comma-separated list to capture more:
+- `cprofile`: run the whole call under cProfile and write the stats to
+  `<output>.prof` (load with `python -m pstats`),
+- `tracemalloc`: trace Python allocations and record the peak per stage.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+
+PROFILE_ENV = "CFS_POSTPROC_PROFILE"
+PROFILE_SUFFIX = ".prof"
+
+
+def profile_modes(environ=os.environ) -> set[str]:
+    """Capture modes requested through PROFILE_ENV (lower-cased names)."""
+    return {m.strip().lower() for m in environ.get(PROFILE_ENV, "").split(",") if m.strip()}
+
+
+class Stage:
+    """One timed step: wall `seconds`, input `nbytes` / `lines` it handled."""
+
+    __slots__ = ("name", "nbytes", "lines", "seconds", "peak_memory", "_timer", "_t0")
+
+    def __init__(self, name: str, nbytes: int = 0, lines: int = 0, timer=None):
+        self.name = name
+        self.nbytes = nbytes
+        self.lines = lines
+        self.seconds = 0.0
+        self.peak_memory = None  # bytes, with tracemalloc capture only
+        self._timer = timer
+        self._t0 = 0.0
+
+    @property
+    def mb_per_s(self):
+        if not self.nbytes or self.seconds <= 0:
+            return None
+        return self.nbytes / self.seconds / 1e6
+
+    def as_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "seconds": self.seconds,
+            "bytes": self.nbytes,
+            "lines": self.lines,
+            "mb_per_s": self.mb_per_s,
+            "peak_memory": self.peak_memory,
+        }
+
+    def __enter__(self) -> Stage:
+        if self._timer is not None and self._timer.trace_memory:
+            import tracemalloc
+
+            tracemalloc.reset_peak()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self._t0
+        if self._timer is not None:
+            self._timer._finish(self)
+
+    def __repr__(self):
+        return f"Stage({self.name!r}, {self.seconds:.6f}s, {self.nbytes} bytes, {self.lines} lines)"
+
+
+class StageTimer:
+    """Collects the stages of one run, in the order they finish.
+
+    `on_stage(stage)` is called as each stage finishes (e.g. to export metrics
+    from a service). With `trace_memory`, tracemalloc must be tracing.
+    """
+
+    def __init__(self, on_stage=None, trace_memory: bool = False):
+        self.stages = []
+        self.on_stage = on_stage
+        self.trace_memory = trace_memory
+
+    def stage(self, name: str, nbytes: int = 0, lines: int = 0) -> Stage:
+        return Stage(name, nbytes, lines, self)
+
+    def _finish(self, stage: Stage):
+        if self.trace_memory:
+            import tracemalloc
+
+            stage.peak_memory = tracemalloc.get_traced_memory()[1]
+        self.stages.append(stage)
+        if self.on_stage is not None:
+            self.on_stage(stage)
+
+
+def format_stages(stages, total: float | None = None):
+    """Text table of `stages` (one str per line), with an optional total wall time."""
+    memory = any(s.peak_memory is not None for s in stages)
+    head = f"{'stage':<14} {'seconds':>9} {'MB':>9} {'lines':>11} {'MB/s':>9}"
+    out = [head + (f" {'peak MB':>9}" if memory else "")]
+    for s in stages:
+        mbs = s.mb_per_s
+        row = (
+            f"{s.name:<14} {s.seconds:9.4f} {f'{s.nbytes / 1e6:.2f}' if s.nbytes else '-':>9} "
+            f"{s.lines or '-':>11} "
+            f"{'-' if mbs is None else f'{mbs:.1f}':>9}"
+        )
+        if memory:
+            peak = s.peak_memory
+            row += f" {'-' if peak is None else f'{peak / 1e6:.2f}':>9}"
+        out.append(row)
+    if total is not None:
+        out.append(f"{'total':<14} {total:9.4f}")
+    return out
@@ -0,0 +1,64 @@
+"""
+stream.py
+Incremental line I/O for constant-memory processing.
+
+`iter_line_batches()` yields the lines `Path.read_bytes().splitlines(keepends=True)`
+would produce, in lists covering roughly `buffer_size` bytes each. Lines stay
+raw bytes with their original terminator ("\\n", "\\r\\n" or "\\r"), so nothing
+is decoded and writing them back reproduces the input exactly.
+`write_batches()` writes through a temporary file and renames it into place.
+
+Peak memory is bounded by the buffer size (plus the longest single line),
+never by the file size.
+"""
+
+from __future__ import annotations
+
+from itertools import chain
+from pathlib import Path
+
+DEFAULT_BUFFER_SIZE = 1 << 20  # bytes per read batch
+
+
+def iter_line_batches(
+    path,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    start: int = 0,
+    end: int | None = None,
+):
+    """Yield lists of byte lines of `path` (terminators kept), reading incrementally.
+
+    `start`/`end` restrict reading to a byte range that begins at a line start.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = -1 if end is None else end - start
+        tail = b""
+        while remaining:
+            raw = f.read(buffer_size if remaining < 0 else min(buffer_size, remaining))
+            if not raw:
+                break
+            if remaining > 0:
+                remaining -= len(raw)
+            lines = (tail + raw).splitlines(keepends=True)
+            # A trailing "\r" may be the first half of a "\r\n" split across reads
+            tail = b"" if lines[-1].endswith(b"\n") else lines.pop()
+            if lines:
+                yield lines
+        if tail:
+            yield [tail]
+
+
+def iter_lines(path, buffer_size: int = DEFAULT_BUFFER_SIZE, start: int = 0, end=None):
+    """Yield the byte lines of `path` one by one, reading incrementally."""
+    return chain.from_iterable(iter_line_batches(path, buffer_size, start, end))
+
+
+def write_batches(path: Path, head: bytes, batches):
+    """Atomically write `head`, then every line of every batch as-is."""
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(head)
+        for batch in batches:
+            f.write(b"".join(batch))
+    tmp.replace(path)
@@ -0,0 +1,11 @@
+import pathlib
+
+import pytest
+
+SAMPLES = pathlib.Path(__file__).resolve().parent.parent / "samples"
+
+
+@pytest.fixture
+def sample() -> pathlib.Path:
+    """The sample Creality Print job (`samples/input.gcode`)."""
+    return SAMPLES / "input.gcode"
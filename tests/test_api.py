@@ -0,0 +1,100 @@
+import json
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cfs_postproc.cfs_postproc import Options, main, options_fingerprint, parse_args, process
+
+JOB = (
+    "; flush_multiplier = 0.5\n"
+    "; flush_volumes_matrix = " + ",".join(["100"] * 16) + "\n"
+    "T0\n;LAYER_CHANGE\n; WIPE_TOWER_START\nG1 X10 Y20\nG1 X30 Y40\n; WIPE_TOWER_END\nT1\nT2\n"
+)
+
+
+def test_process_matches_command_line(tmp_path):
+    src = tmp_path / "in.gcode"
+    src.write_text(JOB, encoding="utf-8")
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "cfs_postproc",
+            str(src),
+            str(tmp_path / "cli.gcode"),
+            "--deterministic",
+        ],
+        check=True,
+    )
+    report = process(src, tmp_path / "api.gcode", Options(deterministic=True))
+    assert (tmp_path / "api.gcode").read_bytes() == (tmp_path / "cli.gcode").read_bytes()
+    assert report.header[1] == "; applied_flush_multiplier: 0.500000"
+    assert report.fingerprint == options_fingerprint(parse_args(["-", "-"]))
+    assert not report.cached
+
+
+def test_process_is_reentrant(tmp_path):
+    src = tmp_path / "in.gcode"
+    src.write_text(JOB, encoding="utf-8")
+    variants = [
+        Options(precut_mm=n, m118_sentinels=n % 2 == 1, deterministic=True) for n in range(8)
+    ]
+    expected = []
+    for n, opts in enumerate(variants):
+        process(src, tmp_path / f"serial{n}.gcode", opts)
+        expected.append((tmp_path / f"serial{n}.gcode").read_bytes())
+
+    with ThreadPoolExecutor(4) as pool:
+        reports = list(
+            pool.map(
+                lambda n: process(src, tmp_path / f"thread{n}.gcode", variants[n]),
+                range(len(variants)),
+            )
+        )
+    assert [(tmp_path / f"thread{n}.gcode").read_bytes() for n in range(8)] == expected
+    assert len({r.fingerprint for r in reports}) == 8
+
+
+def test_options_validate_and_convert():
+    with pytest.raises(ValueError):
+        Options(jobs=0)
+    with pytest.raises(ValueError):
+        Options(jobs=2, stream=True)
+    for other in ({"jobs": 2}, {"stream": True}, {"no_splice": True}):
+        with pytest.raises(ValueError):
+            Options(index=True, **other)
+    with pytest.raises(ValueError):
+        Options(jobs=2)._replace(stream=True)
+    with pytest.raises(SystemExit):
+        parse_args(["a", "b", "--index", "--stream"])
+    args = parse_args(["a", "b", "--precut-mm", "12", "--index", "--console-summary"])
+    assert Options.from_args(args) == Options(precut_mm=12.0, index=True)
+
+
+def test_report_json(tmp_path, capsys):
+    src = tmp_path / "in.gcode"
+    src.write_text(JOB + "T1\nT0\n", encoding="utf-8")
+    out = tmp_path / "out.gcode"
+    main([str(src), str(out), "--report-json", str(tmp_path / "r.json")])
+    doc = json.loads((tmp_path / "r.json").read_text(encoding="utf-8"))
+    assert doc["applied_flush_multiplier"] == 0.5
+    assert doc["original_matrix"] == [[100] * 4] * 4
+    assert doc["scaled_matrix"] == [[50] * 4] * 4
+    assert doc["park"] == {"xy": [20.0, 30.0], "source": "tower", "per_layer": 0}
+    assert doc["transition_counts"] == [
+        {"from": 0, "to": 1, "count": 1},
+        {"from": 1, "to": 0, "count": 1},
+        {"from": 1, "to": 2, "count": 1},
+        {"from": 2, "to": 1, "count": 1},
+    ]
+    header = out.read_text(encoding="utf-8").split("\n\n", 1)[0].count("\n") + 2
+    added = out.read_text(encoding="utf-8").count("\n") - src.read_text("utf-8").count("\n")
+    assert doc["injected_lines"] == added - header
+    assert (doc["input_bytes"], doc["output_bytes"]) == (src.stat().st_size, out.stat().st_size)
+    assert [s["name"] for s in doc["stages"]] == ["scan", "plan", "render", "write"]
+
+    main([str(src), str(out), "--report-json", "-", "--precut-park-xy", "1,2"])
+    doc = json.loads(capsys.readouterr().out)
+    assert doc["park"]["source"] == "override" and doc["prime_volume"] is None
@@ -0,0 +1,24 @@
+from cfs_postproc.blocks import index_blocks, index_file, regions
+
+
+def test_block_index_partitions_sample(sample):
+    data = sample.read_bytes()
+    blocks = index_blocks(data)
+    assert [b.name for b in blocks] == ["HEADER", "THUMBNAIL", "THUMBNAIL", "EXECUTABLE", "CONFIG"]
+    assert index_file(sample, chunk_size=4096, max_tail=64 * 1024) == blocks
+    for b in blocks:
+        assert data[b.start :].startswith(f"; {b.name}_BLOCK_START".encode())
+        assert data[: b.end].endswith(f"; {b.name}_BLOCK_END\n".encode())
+
+    parts = regions(blocks, len(data))
+    assert parts[0].start == 0 and parts[-1].end == len(data)
+    assert all(a.end == b.start for a, b in zip(parts, parts[1:]))
+    lines = []
+    for r in parts:
+        lines += data[r.start : r.end].decode("utf-8").splitlines()
+    assert lines == data.decode("utf-8").splitlines()
+
+
+def test_file_without_blocks_is_one_region():
+    assert regions(index_blocks(b"T0\nT1\n"), 6) == regions([], 6)
+    assert [(r.name, r.start, r.end) for r in regions([], 6)] == [("", 0, 6)]
@@ -0,0 +1,85 @@
+import os
+import pathlib
+
+import pytest
+
+from cfs_postproc import cfs_postproc
+from cfs_postproc.cache import ResultCache, digest_file
+
+
+def _run(src, dst, cache, *extra):
+    args = cfs_postproc.parse_args([str(src), str(dst), "--cache-dir", str(cache), *extra])
+    return cfs_postproc.run(args)
+
+
+def test_cache_hit_reuses_output(tmp_path: pathlib.Path, monkeypatch, sample):
+    cache = tmp_path / "cache"
+    a, b, c = tmp_path / "a.gcode", tmp_path / "b.gcode", tmp_path / "c.gcode"
+    hdr = _run(sample, a, cache, "--deterministic")
+    assert "1970-01-01T00:00:00" in hdr[0]
+
+    def fail(args):
+        raise AssertionError("processed despite a cache hit")
+
+    monkeypatch.setattr(cfs_postproc, "_process", fail)
+    assert _run(sample, b, cache, "--deterministic") == hdr
+    assert b.read_bytes() == a.read_bytes()
+    assert _run(sample, b, cache, "--deterministic") == hdr  # b may already be the entry
+    assert sorted(p.name for p in tmp_path.glob("*.gcode*")) == ["a.gcode", "b.gcode"]
+
+    # Any output-affecting option is part of the key
+    monkeypatch.undo()
+    _run(sample, c, cache, "--deterministic", "--precut-mm", "12")
+    assert c.read_bytes() != a.read_bytes()
+    assert len(list(cache.glob("??/*.gcode"))) == 2
+
+
+def test_cache_key_includes_source_date_epoch(tmp_path: pathlib.Path, monkeypatch, sample):
+    cache = tmp_path / "cache"
+    a, b = tmp_path / "a.gcode", tmp_path / "b.gcode"
+    assert "1970-01-01T00:00:00" in _run(sample, a, cache, "--deterministic")[0]
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "86400")
+    assert "1970-01-02T00:00:00" in _run(sample, b, cache, "--deterministic")[0]
+    assert b"1970-01-02T00:00:00" in b.read_bytes().split(b"\n", 1)[0]
+
+    monkeypatch.setenv("SOURCE_DATE_EPOCH", "yesterday")
+    with pytest.raises(SystemExit):
+        cfs_postproc.parse_args([str(sample), str(b), "--deterministic"])
+    with pytest.raises(ValueError, match="SOURCE_DATE_EPOCH"):
+        cfs_postproc.process(sample, b, cfs_postproc.Options(deterministic=True))
+
+
+def test_cache_evicts_least_recently_used(tmp_path: pathlib.Path):
+    cache = ResultCache(tmp_path / "cache")
+    for n, name in enumerate("xyz", 1):
+        out = tmp_path / f"{name}.gcode"
+        out.write_bytes(name.encode() * 10)
+        cache.store(name * 64, out, {"transitions": n})
+        os.utime(cache.entry(name * 64), ns=(n * 10**9, n * 10**9))
+
+    # x becomes the most recent
+    assert cache.fetch("x" * 64, tmp_path / "hit.gcode") == {"transitions": 1}
+    assert digest_file(tmp_path / "hit.gcode") == digest_file(tmp_path / "x.gcode")
+    assert not cache.fetch("0" * 64, tmp_path / "miss.gcode")
+
+    cache.max_bytes = 25
+    cache.evict()
+    assert [cache.entry(k * 64).exists() for k in "xyz"] == [True, False, True]
+    assert [cache.plan_path(k * 64).exists() for k in "xyz"] == [True, False, True]
+
+
+def test_cache_hit_reports_the_stored_plan(tmp_path: pathlib.Path, sample):
+    cache = tmp_path / "cache"
+    miss = cfs_postproc.process(sample, tmp_path / "a.gcode", cfs_postproc.Options(cache_dir=cache))
+    hit = cfs_postproc.process(sample, tmp_path / "b.gcode", cfs_postproc.Options(cache_dir=cache))
+    assert (miss.cached, hit.cached) == (False, True)
+    assert hit.plan == miss.plan and hit.plan["transitions"] == 21
+    a, b = miss.as_dict(), hit.as_dict()
+    assert a.keys() == b.keys()
+
+    # An entry whose summary is gone is a miss, so the report never loses fields
+    next(cache.glob("??/*.json")).unlink()
+    again = cfs_postproc.process(
+        sample, tmp_path / "c.gcode", cfs_postproc.Options(cache_dir=cache)
+    )
+    assert not again.cached and again.plan == miss.plan
@@ -0,0 +1,69 @@
+import pathlib
+
+from cfs_postproc import blocks
+from cfs_postproc.blocks import index_file
+from cfs_postproc.config import (
+    ConfigBlock,
+    find_config_block,
+    needs_scaling,
+    read_config_block,
+    read_metadata,
+)
+from cfs_postproc.scan import scan_lines
+
+
+def test_config_block_found_from_the_end(sample):
+    data = sample.read_bytes()
+    start, end = find_config_block(sample)
+    assert data[start:].startswith(b"; CONFIG_BLOCK_START")
+    assert data[:end].endswith(b"; CONFIG_BLOCK_END\n")
+
+    meta = read_metadata(sample)
+    assert meta.flush_mult == 0.6
+    assert list(meta.matrix_nums[:4]) == [0, 319, 329, 462]
+    assert (meta.wipe_tower_x, meta.wipe_tower_y) == (110.0, 195.0)
+    assert needs_scaling(sample)
+
+
+def test_config_block_markers_agree_with_block_index(tmp_path: pathlib.Path, monkeypatch):
+    monkeypatch.setattr(blocks, "TAIL_CHUNK", 7)  # markers split across reads
+    p = tmp_path / "spaced.gcode"
+    p.write_bytes(
+        b"; EXECUTABLE_BLOCK_START\nT0\n; EXECUTABLE_BLOCK_END\n"
+        b";CONFIG_BLOCK_START \r\n; flush_multiplier = 0.5\r\n  ;  CONFIG_BLOCK_END\r\n"
+        b"; CONFIG_BLOCK_END is not a marker line here\n"
+    )
+    config = next(b for b in index_file(p) if b.name == "CONFIG")
+    assert find_config_block(p) == (config.start, config.end)
+    assert read_metadata(p).flush_mult == 0.5
+    assert find_config_block(p, max_tail=20) is None
+
+
+def test_metadata_falls_back_to_full_scan(tmp_path: pathlib.Path):
+    p = tmp_path / "plain.gcode"
+    p.write_text("; flush_multiplier = 1.0\nT0\nG1 X1\nT1\n", encoding="utf-8")
+    assert find_config_block(p) is None
+    meta = read_metadata(p)
+    assert meta.flush_mult == 1.0 and meta.transitions == [(3, 0, 1)]
+    assert not needs_scaling(p)
+
+
+def test_config_block_typed_accessors(sample):
+    cfg = ConfigBlock.from_file(sample)
+    assert cfg.get_float("flush_multiplier") == 0.6
+    assert cfg.get_int_list("FLUSH_VOLUMES_MATRIX")[:4] == [0, 319, 329, 462]
+    assert cfg.get_float_list("filament_minimal_purge_on_wipe_tower") == [15.0] * 4
+    assert cfg.get_percent_list("wipe_tower_extra_flow") == [100.0]
+    assert cfg.get_colors() == ["#EEE648", "#000000", "#FF8000", "#FFFFFF"]
+    assert cfg.get_int("prime_tower_enhance_type", 7) == 7
+    assert cfg.get_float("no_such_key") is None
+
+
+def test_config_block_metadata_matches_the_scan(sample):
+    lines = read_config_block(sample)
+    meta = ConfigBlock.from_lines(lines).metadata()
+    scanned = scan_lines(lines)
+    assert meta.line_count == 0
+    meta.line_count = scanned.line_count
+    assert meta == scanned
+    assert meta.filament_count == len(ConfigBlock.from_lines(lines).get_colors())
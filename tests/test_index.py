@@ -0,0 +1,53 @@
+import pathlib
+
+from cfs_postproc.index import GcodeIndex
+from cfs_postproc.sparse import scan_file
+
+
+def _layered(path: pathlib.Path):
+    layers = []
+    for n in range(12):
+        body = f";LAYER_CHANGE\n;Z:{n * 0.2:.1f}\n;TYPE:Outer wall\nG1 X1 Y1 E1\n"
+        if n % 3 == 1:
+            body += f"; WIPE_TOWER_START\nG1 X{100 + n} Y{50 - n}\nG1 X{90 + n} Y{60}\n"
+        body += f"T{n % 4}\n"
+        if n % 3 == 2:  # sections span a layer change
+            body += "; WIPE_TOWER_END\n"
+        layers.append(body)
+    text = (
+        "; HEADER_BLOCK_START\n; HEADER_BLOCK_END\n; EXECUTABLE_BLOCK_START\nT0\n"
+        + "".join(layers)
+        + "; EXECUTABLE_BLOCK_END\n; CONFIG_BLOCK_START\n; CONFIG_BLOCK_END\n"
+    )
+    path.write_bytes(text.encode())
+
+
+def test_index_queries(tmp_path: pathlib.Path):
+    src = tmp_path / "in.gcode"
+    _layered(src)
+    scan = scan_file(src)
+    data = src.read_bytes()
+    with GcodeIndex.open(src) as ix:
+        assert ix.layer_count == 12
+        assert ix.layer_lines(3)[:2] == [b";LAYER_CHANGE\n", b";Z:0.6\n"]
+        assert ix.layer_bytes(11).endswith(b"; EXECUTABLE_BLOCK_END\n")
+        assert ix.layer_of(ix.layers[5] + 3) == 5 and ix.layer_of(0) is None
+
+        # Same transitions as the scan engine, with byte offsets
+        assert [(scan.offsets[i], fr, to) for i, fr, to in scan.transitions] == ix.transitions
+        assert ix.transitions_into(2) == [t for t in ix.transitions if t[2] == 2]
+        assert [to for _, _, to in ix.layer_transitions(5)] == [1]
+        assert ix.tool_at(ix.layers[6]) == 1 and ix.tool_at(ix.layers[7]) == 2
+
+        assert ix.type_at(ix.layers[4] + 30) == "Outer wall"
+        assert ix.tower_extents(0) is None and ix.tower_extents(3) is None
+        assert ix.tower_extents(2) == (1.0, 1.0, 1.0, 1.0)  # the clipped tail of the section
+        assert ix.tower_extents(4) == (94.0, 46.0, 104.0, 60.0)
+        boxes = [ix.tower_extents(n) for n in range(12) if ix.tower_extents(n)]
+        assert scan.tower_bbox == (
+            min(b[0] for b in boxes),
+            min(b[1] for b in boxes),
+            max(b[2] for b in boxes),
+            max(b[3] for b in boxes),
+        )
+        assert all(data[a:b].count(b"WIPE_TOWER") == 0 for a, b in ix.tower_sections())
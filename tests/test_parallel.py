@@ -0,0 +1,84 @@
+import pathlib
+
+import pytest
+
+from cfs_postproc import parallel
+from cfs_postproc.cfs_postproc import Options, process_file
+from cfs_postproc.sparse import scan_file
+
+OPTIONS = Options(m118_sentinels=True)
+
+
+def _layered(path: pathlib.Path):
+    layers = []
+    for n in range(40):
+        tool = (n // 2) % 3
+        body = f";LAYER_CHANGE\n;Z:{n * 0.2:.1f}\n"
+        if n % 4 == 1:
+            body += f"; WIPE_TOWER_START\nG1 X{100 + n} Y{50 - n}\n"
+        if n % 4 != 2:
+            # Same-tool repeats must not become transitions across chunk borders
+            body += f"T{tool}\nG1 X1 Y1 E1\n"
+        if n % 4 == 3:
+            body += "; WIPE_TOWER_END\n"
+        layers.append(body)
+    text = (
+        "; HEADER_BLOCK_START\n; HEADER_BLOCK_END\n; EXECUTABLE_BLOCK_START\n"
+        + "".join(layers)
+        + "; EXECUTABLE_BLOCK_END\n; CONFIG_BLOCK_START\n; flush_multiplier = 0.5\n"
+        "; flush_volumes_matrix = " + ",".join(["100"] * 16) + "\n"
+        "; enable_prime_tower = 1\n; prime_volume = 20\n; CONFIG_BLOCK_END\n"
+    )
+    path.write_bytes(text.encode())
+
+
+@pytest.mark.parametrize("splice", [True, False])
+def test_parallel_matches_serial(tmp_path: pathlib.Path, monkeypatch, splice):
+    monkeypatch.setattr(parallel, "MIN_CHUNK", 64)
+    src = tmp_path / "in.gcode"
+    _layered(src)
+    a, b = tmp_path / "a.gcode", tmp_path / "b.gcode"
+    process_file(src, a, OPTIONS, splice=splice)
+    parallel.process_parallel(src, b, OPTIONS, jobs=2, splice=splice)
+    assert a.read_bytes().split(b"\n", 1)[1] == b.read_bytes().split(b"\n", 1)[1]
+
+
+def test_merge_scans_matches_whole_file_scan(tmp_path: pathlib.Path, monkeypatch, sample):
+    monkeypatch.setattr(parallel, "MIN_CHUNK", 64)
+    src = tmp_path / "in.gcode"
+    _layered(src)
+    for path in (src, sample):
+        data = path.read_bytes()
+        bounds = parallel.chunk_bounds(data, [], 16)
+        assert len(bounds) > 3
+        chunks = [parallel.scan_chunk(path, a, b) for a, b in zip(bounds, bounds[1:])]
+        merged = parallel.merge_scans(path, chunks)
+        whole = scan_file(path)
+        assert merged == whole
+        assert merged.offsets == whole.offsets
+
+
+def _shrinking_tower(path: pathlib.Path, layers: int = 60):
+    """Tower 20 mm wide on layers 0..29, 5 mm from there on; a tool change per layer."""
+    body = []
+    for n in range(layers):
+        x1 = 200 if n < 30 else 185
+        body.append(
+            f";LAYER_CHANGE\n; WIPE_TOWER_START\nG1 X180 Y50\nG1 X{x1} Y60\n"
+            f"; WIPE_TOWER_END\nT{n % 2}\nG1 X1 Y1 E1\n"
+        )
+    path.write_text("; EXECUTABLE_BLOCK_START\n" + "".join(body) + "; EXECUTABLE_BLOCK_END\n")
+
+
+@pytest.mark.parametrize("splice", [True, False])
+def test_parallel_matches_serial_with_stable_layers(tmp_path: pathlib.Path, monkeypatch, splice):
+    monkeypatch.setattr(parallel, "MIN_CHUNK", 64)
+    src = tmp_path / "in.gcode"
+    _shrinking_tower(src)
+    args = OPTIONS._replace(tower_stable_layers=3)
+    a, b = tmp_path / "a.gcode", tmp_path / "b.gcode"
+    process_file(src, a, args, splice=splice)
+    parallel.process_parallel(src, b, args, jobs=4, splice=splice)
+    assert a.read_bytes().split(b"\n", 1)[1] == b.read_bytes().split(b"\n", 1)[1]
+    # Serial parks over the wide tower it measured; no chunk may re-measure the narrow one
+    assert b"G0 X182.500" not in b.read_bytes() and b"G0 X190.000" in b.read_bytes()
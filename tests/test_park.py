@@ -0,0 +1,54 @@
+from cfs_postproc.cfs_postproc import Options, process_data
+from cfs_postproc.scan import LineScanner, scan_lines
+from cfs_postproc.sparse import sparse_scan
+
+
+def _job(widths) -> bytes:
+    """One tool change per layer; the tower is `width` mm deep on each layer (0: no tower)."""
+    out = ["T0\n"]
+    for n, w in enumerate(widths):
+        out.append(f";LAYER_CHANGE\n;Z:{n * 0.2:.1f}\nG1 X1 Y1 E1\n")
+        if w:
+            out.append(f"; WIPE_TOWER_START\nG1 X100 Y100\nG1 X110 Y{100 + w}\n; WIPE_TOWER_END\n")
+        out.append(f"T{(n + 1) % 2}\n")
+    return "".join(out).encode()
+
+
+def test_scan_records_tower_per_layer():
+    data = _job([20, 20, 10, 0, 10])
+    res = sparse_scan(data)
+    assert res == scan_lines(data.splitlines(keepends=True))
+    assert len(res.layer_lines) == 5
+    assert res.tower_layers == {
+        0: (100.0, 100.0, 110.0, 120.0),
+        1: (100.0, 100.0, 110.0, 120.0),
+        2: (100.0, 100.0, 110.0, 110.0),
+        4: (100.0, 100.0, 110.0, 110.0),
+    }
+    assert res.tower_bbox == (100.0, 100.0, 110.0, 120.0)
+
+
+def test_tower_detection_stops_after_stable_layers():
+    data = _job([20, 20, 20, 10, 10])
+    lines = data.splitlines(keepends=True)
+    a = sparse_scan(data, LineScanner(tower_stable_layers=2))
+    b = LineScanner(tower_stable_layers=2).feed(lines).finish()
+    assert a == b
+    assert sorted(a.tower_layers) == [0, 1]
+
+
+def test_transitions_park_over_their_layers_tower():
+    out, hdr = process_data(_job([20, 20, 10, 0]), Options())
+    parks = [ln for ln in out.splitlines() if ln.startswith(b"G0 ")]
+    assert parks == [
+        b"G0 X105.000 Y110.000 F18000",
+        b"G0 X105.000 Y110.000 F18000",
+        b"G0 X105.000 Y105.000 F18000",
+        b"G0 X105.000 Y105.000 F18000",  # no tower on this layer: the one below
+    ]
+    assert "; park XY per layer: 2 of 4 transitions parked over their layer's tower" in hdr
+
+    # An explicit park point still wins
+    out, hdr = process_data(_job([20, 20, 10, 0]), Options(precut_park_xy="5,6"))
+    assert {ln for ln in out.splitlines() if ln.startswith(b"G0 ")} == {b"G0 X5.000 Y6.000 F18000"}
+    assert not any("per layer" in h for h in hdr)
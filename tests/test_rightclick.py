@@ -0,0 +1,102 @@
+import json
+import os
+import pathlib
+import subprocess
+import sys
+
+from cfs_postproc import cfs_postproc_rightclick as rc_mod
+
+SCRIPT = pathlib.Path(rc_mod.__file__)
+
+
+def test_batch_isolates_failures(tmp_path: pathlib.Path, capsys):
+    good = tmp_path / "a.gcode"
+    good.write_text("T0\nT1\n", encoding="utf-8")
+    bad = tmp_path / "b.gcode"
+    bad.write_text("T0\n", encoding="utf-8")
+    (tmp_path / "b_scaled_precut.gcode").mkdir()  # output cannot be written
+    missing = tmp_path / "c.gcode"
+
+    assert rc_mod.main([str(bad), str(good)]) == 1
+    assert rc_mod.main([str(good), str(missing)]) == 2
+    assert b"\nT1\n" in (tmp_path / "a_scaled_precut.gcode").read_bytes()
+    out = capsys.readouterr()
+    assert "[OK] ->" in out.out and "[ERR] b.gcode" in out.err
+    assert f"[RUN] {good} -> {tmp_path / 'a_scaled_precut.gcode'} (m118_sentinels=True)" in out.out
+
+
+def test_parallel_batch_keeps_exit_code_semantics(tmp_path: pathlib.Path, capsys):
+    files = []
+    for n in range(4):
+        p = tmp_path / f"f{n}.gcode"
+        p.write_text(f"T0\nT{n}\n", encoding="utf-8")
+        files.append(str(p))
+    bad = tmp_path / "bad.gcode"
+    bad.write_text("T0\n", encoding="utf-8")
+    (tmp_path / "bad_scaled_precut.gcode").mkdir()
+    missing = str(tmp_path / "missing.gcode")
+
+    assert rc_mod.main(["--jobs", "3", *files]) == 0
+    assert rc_mod.main(["-j", "2", str(bad), files[0], missing]) == 2
+    assert rc_mod.main(["-j", "2", missing, str(bad), files[1]]) == 1
+    out = capsys.readouterr()
+    assert out.out.count("[OK] ->") == 6
+    for n in range(4):
+        assert (tmp_path / f"f{n}_scaled_precut.gcode").exists()
+
+
+def test_directory_mode_skips_up_to_date_and_resumes(tmp_path: pathlib.Path, capsys):
+    root = tmp_path / "plates"
+    (root / "sub").mkdir(parents=True)
+    a = root / "a.gcode"
+    b = root / "sub" / "b.gcode.pp"
+    for p in (a, b):
+        p.write_text("T0\nT1\n", encoding="utf-8")
+    (root / "notes.txt").write_text("x", encoding="utf-8")
+
+    assert rc_mod.main(["-j", "1", str(root)]) == 0
+    out_a, out_b = root / "a_scaled_precut.gcode", root / "sub" / "b_scaled_precut.gcode"
+    assert out_a.exists() and out_b.exists()
+    journal = root / rc_mod.JOURNAL_NAME
+    assert len(journal.read_text(encoding="utf-8").splitlines()) == 2
+    capsys.readouterr()
+
+    # Nothing changed: everything is skipped, outputs are not reprocessed into new outputs
+    assert rc_mod.main(["-j", "1", str(root)]) == 0
+    assert "0 processed, 2 up to date" in capsys.readouterr().out
+    assert not (root / "a_scaled_precut_scaled_precut.gcode").exists()
+
+    # Without the journal the output mtime + header fingerprint still decide
+    journal.unlink()
+    assert rc_mod.main(["-j", "1", str(root)]) == 0
+    assert "0 processed, 2 up to date" in capsys.readouterr().out
+
+    # A touched input is redone; a stale fingerprint in the output forces a redo too
+    os.utime(a, ns=(out_a.stat().st_mtime_ns + 10**9,) * 2)
+    out_b.write_bytes(out_b.read_bytes().replace(b"fingerprint: ", b"fingerprint: x"))
+    journal.unlink()
+    assert rc_mod.main(["-j", "1", str(root)]) == 0
+    assert "[DONE]" not in capsys.readouterr().out
+    assert rc_mod.main(["-j", "1", "--force", str(root)]) == 0
+    assert len(journal.read_text(encoding="utf-8").splitlines()) == 2
+
+
+def test_runs_as_script(tmp_path: pathlib.Path):
+    src = tmp_path / "job.gcode.pp"
+    src.write_text("T0\n", encoding="utf-8")
+    res = subprocess.run([sys.executable, str(SCRIPT), str(src)], capture_output=True, text=True)
+    assert res.returncode == 0, res.stderr
+    assert (tmp_path / "job_scaled_precut.gcode").exists()
+
+
+def test_ndjson_reports_on_stdout(tmp_path: pathlib.Path, capsys):
+    good = tmp_path / "a.gcode"
+    good.write_text("T0\nT1\n", encoding="utf-8")
+    missing = tmp_path / "c.gcode"
+
+    assert rc_mod.main(["--ndjson", str(good), str(missing)]) == 2
+    out = capsys.readouterr()
+    first, second = (json.loads(line) for line in out.out.splitlines())
+    assert first["infile"] == str(good) and first["transitions"] == 1
+    assert second == {"infile": str(missing), "error": "not found"}
+    assert "[OK] ->" in out.err
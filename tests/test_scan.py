@@ -0,0 +1,83 @@
+from cfs_postproc.cfs_postproc import Options, process_data
+from cfs_postproc.scan import RE_COMMENT, RE_SETTING, WT_ENDS, WT_STARTS, parse_matrix, scan_lines
+from cfs_postproc.sparse import sparse_scan
+
+
+def test_scan_collects_metadata_tower_and_transitions():
+    lines = [
+        "; flush_multiplier = 0.5",
+        "T0",
+        ";WIPE_TOWER_START",
+        "G1 X10 Y20 E1",
+        "G1 X30 Y40",
+        ";WIPE_TOWER_END",
+        "T1 ; next",
+        "T1",
+        "  T2  ",
+        "; flush_volumes_matrix = " + ",".join(["10"] * 16),
+        "; enable_prime_tower = 1",
+        "; wipe_tower_x = 110.5",
+    ]
+    res = scan_lines(lines)
+    assert res.flush_mult == 0.5 and res.flush_mult_idx == 0
+    assert res.matrix_idx == 9 and list(res.matrix_nums) == [10] * 16
+    assert res.enable_prime_tower == 1
+    assert res.wipe_tower_x == 110.5 and res.wipe_tower_y is None
+    assert res.tower_center == (20.0, 30.0)
+    assert res.transitions == [(6, 0, 1), (8, 1, 2)]
+    assert res.line_count == len(lines)
+
+
+def test_comment_classifier_matches_separate_regexes():
+    lines = [
+        b"; flush_multiplier = 0.5\n",
+        b"  ;key=v\r\n",
+        b";WIPE_TOWER_START\n",
+        b";; wipe_tower_end\n",
+        b"; CP WIPE_TOWER START\n",
+        b";TYPE:Wipe tower\r\n",
+        b"; END WIPE TOWER\n",
+        b";; prime_tower_start = 1\n",
+        b"; WIPE_TOWER_STARTED\n",
+        b";TYPE:Outer wall\n",
+        b";\n",
+    ]
+    for ln in lines:
+        if RE_SETTING.match(ln):
+            expected = "value"
+        elif any(p.match(ln) for p in WT_STARTS):
+            expected = "start"
+        elif any(p.match(ln) for p in WT_ENDS):
+            expected = "end"
+        else:
+            expected = None
+        m = RE_COMMENT.match(ln)
+        assert (m.lastgroup if m else None) == expected, ln
+
+
+def test_sixteen_tools():
+    matrix = [0 if r == c else 100 + r for r in range(16) for c in range(16)]
+    data = (
+        "T0\nT9\nT15 ; last slot\nT16\nT12\n"
+        "; filament_colour = " + ";".join(["#FFFFFF"] * 16) + "\n"
+        "; flush_multiplier = 2\n"
+        "; flush_volumes_matrix = " + ",".join(map(str, matrix)) + "\n"
+    ).encode()
+    res = scan_lines(data.splitlines(keepends=True))
+    assert res.transitions == [(1, 0, 9), (2, 9, 15), (4, 15, 12)]
+    assert res.tool_count == 16 and res.filament_count == 16
+    assert list(res.matrix_nums) == matrix
+    assert sparse_scan(data) == res
+
+    out, hdr = process_data(data, Options())
+    rows = hdr[hdr.index("; scaled flush_volumes_matrix (mm^3) written:") + 1 :][:16]
+    assert rows[15] == ";   " + ", ".join([" 230"] * 15 + ["   0"])
+    assert out.count(b"pre-cut retract before T") == 3
+    assert b"pre-cut retract before T15" in out and b"before T16" not in out
+
+
+def test_matrix_size_gives_tool_count():
+    assert list(parse_matrix("1,2,3,4")) == [1, 2, 3, 4]
+    assert parse_matrix(",".join(["1"] * 12)) is None  # not square
+    assert parse_matrix(",".join(["1"] * 17 * 17)) is None  # more than 16 tools
+    assert scan_lines(["; filament_colour = #000000;#FFFFFF"]).tool_count == 2
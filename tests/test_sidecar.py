@@ -0,0 +1,64 @@
+import json
+import os
+import pathlib
+
+from cfs_postproc import cfs_postproc
+from cfs_postproc.sidecar import load_index, sidecar_path
+
+
+def _run(src, dst, *extra):
+    args = cfs_postproc.parse_args([str(src), str(dst), "--deterministic", *extra])
+    return cfs_postproc.run(args)
+
+
+def test_index_skips_rescan(tmp_path: pathlib.Path, monkeypatch, sample):
+    src = tmp_path / "in.gcode"
+    src.write_bytes(sample.read_bytes())
+    _run(src, tmp_path / "a.gcode", "--index")
+    doc = json.loads(sidecar_path(src).read_text())
+    assert doc["tool_changes"] and doc["size"] == src.stat().st_size
+    assert all(src.read_bytes()[off : off + 1] == b"T" for _, off, _, _ in doc["tool_changes"])
+
+    # Only injection options change: the sidecar replaces the scan
+    fresh = tmp_path / "fresh.gcode"
+    _run(src, fresh, "--precut-mm", "12")
+
+    def fail(*a, **kw):
+        raise AssertionError("rescanned despite a current sidecar")
+
+    monkeypatch.setattr(cfs_postproc, "sparse_scan", fail)
+    _run(src, tmp_path / "b.gcode", "--index", "--precut-mm", "12")
+    assert (tmp_path / "b.gcode").read_bytes() == fresh.read_bytes()
+
+
+def test_index_invalidated_by_input_change(tmp_path: pathlib.Path, sample):
+    src = tmp_path / "in.gcode"
+    src.write_bytes(sample.read_bytes())
+    _run(src, tmp_path / "a.gcode", "--index")
+    assert load_index(src, src.read_bytes()) is not None
+
+    src.write_bytes(b"; moved\n" + sample.read_bytes())
+    os.utime(src, ns=(1, 1))
+    assert load_index(src, src.read_bytes()) is None
+    _run(src, tmp_path / "b.gcode", "--index")
+    _run(src, tmp_path / "c.gcode")
+    assert (tmp_path / "b.gcode").read_bytes() == (tmp_path / "c.gcode").read_bytes()
+    assert load_index(src, src.read_bytes()) is not None
+
+
+def test_index_rejected_after_same_size_rewrite(tmp_path: pathlib.Path, sample):
+    src = tmp_path / "in.gcode"
+    data = sample.read_bytes()
+    src.write_bytes(data)
+    _run(src, tmp_path / "a.gcode", "--index")
+    st = src.stat()
+
+    # Same size and mtime (e.g. a FAT timestamp), but every line moved by one byte
+    moved = b";" + data[:-1]
+    assert len(moved) == len(data) and moved != data
+    src.write_bytes(moved)
+    os.utime(src, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert load_index(src, moved) is None
+    _run(src, tmp_path / "b.gcode", "--index")
+    _run(src, tmp_path / "c.gcode")
+    assert (tmp_path / "b.gcode").read_bytes() == (tmp_path / "c.gcode").read_bytes()
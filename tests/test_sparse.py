@@ -0,0 +1,59 @@
+import pathlib
+
+import pytest
+
+from cfs_postproc import scan
+from cfs_postproc.scan import scan_lines
+from cfs_postproc.sparse import plain_line_breaks, scan_file, sparse_scan
+
+
+def test_sparse_scan_matches_line_scan_on_sample(sample):
+    data = sample.read_bytes()
+    assert scan_file(sample) == scan_lines(data.decode("utf-8").splitlines())
+
+
+def test_sparse_scan_tower_and_crlf():
+    text = (
+        "T0\r\n; WIPE_TOWER_START\r\nG1 X10 Y5\r\n T1\r\nG1 X20 Y7 ; X99\r\n"
+        ";WIPE_TOWER_END\r\nG1 X500 Y500\r\n; wipe_tower_x = 3\r\nT1\r\nT2"
+    )
+    data = text.encode()
+    assert plain_line_breaks(data)
+    res = sparse_scan(data)
+    assert res == scan_lines(text.splitlines())
+    assert res.transitions == [(3, 0, 1), (9, 1, 2)]
+    assert res.tower_bbox == (10.0, 5.0, 20.0, 7.0)
+
+
+def test_exotic_line_breaks_fall_back(tmp_path: pathlib.Path):
+    p = tmp_path / "cr.gcode"
+    p.write_bytes(b"T0\rT1\rT2\n")
+    assert not plain_line_breaks(p.read_bytes())
+    assert scan_file(p).transitions == [(1, 0, 1), (2, 1, 2)]
+
+
+@pytest.mark.parametrize("use_numpy", [False, True])
+def test_block_extents_match_per_line_search(monkeypatch, use_numpy):
+    if use_numpy:
+        pytest.importorskip("numpy")
+        monkeypatch.setattr(scan, "NUMPY_MIN_VALUES", 1)
+    data = (
+        b"G1 X10.5 Y-3 E1\n"
+        b"G1 X2 Y4 ; X99 Y99\r\n"
+        b"G1 E-0.8 F2100\n"
+        b"G0 AX7 Y1. X-4\n"
+        b"G1 X11"
+    )
+    scanner = scan.LineScanner(in_tower=True).feed(data.splitlines(keepends=True))
+    assert scan.block_extents(data, use_numpy) == (
+        scanner.minx,
+        scanner.miny,
+        scanner.maxx,
+        scanner.maxy,
+    )
+    assert scan.block_extents(b"G1 E1\n", use_numpy) == (
+        float("inf"),
+        float("inf"),
+        float("-inf"),
+        float("-inf"),
+    )
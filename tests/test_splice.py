@@ -0,0 +1,86 @@
+import errno
+import pathlib
+
+import pytest
+
+from cfs_postproc import splice
+from cfs_postproc.cfs_postproc import (
+    Options,
+    TransitionTemplates,
+    process,
+    process_file,
+    process_spliced,
+    render_transition,
+)
+
+
+@pytest.mark.parametrize("strategy", ["copy_file_range", "sendfile", "buffered"])
+def test_splice_file_strategies(tmp_path: pathlib.Path, monkeypatch, strategy):
+    monkeypatch.setattr(splice, "_STRATEGIES", [strategy, "buffered"])
+    src = tmp_path / "src.bin"
+    src.write_bytes(b"0123456789")
+    dst = tmp_path / "dst.bin"
+    splice.splice_file(src, dst, b"H:", [(2, 4, b"ab"), (7, 7, b"+")], b"!")
+    assert dst.read_bytes() == b"H:01ab456+789!"
+
+
+def test_splice_without_kernel_copy_or_pread(tmp_path: pathlib.Path, monkeypatch, sample):
+    # e.g. Windows: only the buffered copy is left, and it must not need os.pread
+    for name in ("copy_file_range", "sendfile", "pread"):
+        monkeypatch.delattr(splice.os, name, raising=False)
+    a, b = tmp_path / "a.gcode", tmp_path / "b.gcode"
+    process(sample, a, Options(deterministic=True))
+    process(sample, b, Options(deterministic=True, no_splice=True))
+    assert a.read_bytes() == b.read_bytes()
+
+
+def test_spliced_output_matches_text_path(tmp_path: pathlib.Path, sample):
+    args = Options(m118_sentinels=True)
+    a, b = tmp_path / "a.gcode", tmp_path / "b.gcode"
+    assert process_spliced(sample, a, args) is not None
+    process_file(sample, b, args, splice=False)
+    # Skip the timestamped first header line
+    assert a.read_bytes().split(b"\n", 1)[1] == b.read_bytes().split(b"\n", 1)[1]
+
+    crlf = tmp_path / "crlf.gcode"
+    crlf.write_bytes(b"T0\r\nT1\r\nG1 \xff")
+    assert process_spliced(crlf, a, args) is not None
+    process_file(crlf, b, args, splice=False)
+    assert a.read_bytes().split(b"\n", 1)[1] == b.read_bytes().split(b"\n", 1)[1]
+
+    lone_cr = tmp_path / "cr.gcode"
+    lone_cr.write_bytes(b"T0\rT1\r")
+    assert process_spliced(lone_cr, a, args) is None
+
+
+@pytest.mark.parametrize("sentinels", [True, False])
+@pytest.mark.parametrize("line", [b"T2\n", b"  T2 ; swap\r\n", b"T2"])
+def test_transition_templates_match_render(sentinels, line):
+    args = Options(precut_mm=12.5, m118_sentinels=sentinels)
+    render = TransitionTemplates(args, b"\r\n")
+    for park in [(5.0, 6.0), None, (5.0, 6.0)]:  # the last one comes from the cache
+        expected = render_transition(1, 2, line, args, park, b"\r\n")
+        assert render(1, 2, line, park) == expected
+    # Per-layer park points: one template per (from, to, ...), not per park point
+    for n in range(50):
+        park = (100 + n / 7, 20.0)
+        assert render(1, 2, line, park) == render_transition(1, 2, line, args, park, b"\r\n")
+    assert len(render._blocks) == 2
+
+
+def test_failed_strategy_is_dropped_for_one_call_only(tmp_path: pathlib.Path, monkeypatch):
+    calls = []
+
+    def exdev(*args):
+        calls.append(args)
+        raise OSError(errno.EXDEV, "cross-device")
+
+    monkeypatch.setitem(splice._COPIERS, "copy_file_range", exdev)
+    monkeypatch.setattr(splice.os, "copy_file_range", exdev, raising=False)
+    src = tmp_path / "src.bin"
+    src.write_bytes(b"0123456789")
+    for n in range(2):
+        splice.splice_file(src, tmp_path / "dst.bin", b"", [(2, 4, b"ab")])
+        assert (tmp_path / "dst.bin").read_bytes() == b"01ab456789"
+        assert len(calls) == n + 1  # tried again by the next call, once per call
+    assert splice.copy_strategies()[0] == "copy_file_range"
@@ -0,0 +1,41 @@
+from cfs_postproc.cfs_postproc import Options, main, process
+from cfs_postproc.stages import PROFILE_ENV, StageTimer, format_stages
+
+JOB = b"T0\n;LAYER_CHANGE\n; WIPE_TOWER_START\nG1 X10 Y20\n; WIPE_TOWER_END\nT1\nT2\n" * 50
+
+
+def test_process_records_stages(tmp_path):
+    src = tmp_path / "in.gcode"
+    src.write_bytes(JOB)
+    seen = []
+    report = process(src, tmp_path / "out.gcode", timer=StageTimer(on_stage=seen.append))
+    assert [s.name for s in report.stages] == ["scan", "plan", "render", "write"]
+    assert seen == report.stages
+    scan = report.stages[0]
+    assert scan.nbytes == len(JOB) and scan.lines == JOB.count(b"\n")
+    assert report.stages[-1].nbytes == (tmp_path / "out.gcode").stat().st_size
+    assert report.stages[2].lines == 3 * 50 - 1  # injected transitions
+
+    report = process(src, tmp_path / "out.gcode", Options(no_splice=True))
+    assert [s.name for s in report.stages] == ["read", "split", "scan", "plan", "rewrite+write"]
+    assert all(s.seconds >= 0 for s in report.stages)
+
+
+def test_profile_flag_and_capture(tmp_path, capsys, monkeypatch):
+    src = tmp_path / "in.gcode"
+    src.write_bytes(JOB)
+    monkeypatch.setenv(PROFILE_ENV, "cprofile, tracemalloc")
+    main([str(src), str(tmp_path / "out.gcode"), "--profile"])
+    err = capsys.readouterr().err.splitlines()
+    assert err[0].split() == ["stage", "seconds", "MB", "lines", "MB/s", "peak", "MB"]
+    assert err[1].startswith("scan ") and err[-2].startswith("total ")
+    assert err[-1] == f"cProfile stats: {tmp_path / 'out.gcode'}.prof"
+    assert (tmp_path / "out.gcode.prof").stat().st_size > 0
+
+
+def test_format_stages_without_bytes():
+    timer = StageTimer()
+    with timer.stage("plan", lines=3):
+        pass
+    (row,) = format_stages(timer.stages)[1:]
+    assert row.split()[0::2] == ["plan", "-", "-"] and row.split()[3] == "3"
@@ -0,0 +1,51 @@
+import os
+import pathlib
+import subprocess
+import sys
+
+import cfs_postproc
+
+COLD_START_BUDGET_MS = 50
+SRC = str(pathlib.Path(cfs_postproc.__file__).resolve().parent.parent)
+# What the installed `cfs-postproc` console script runs
+ENTRY = "import sys; from cfs_postproc.__main__ import main; sys.argv[0] = 'cfs-postproc'; main()"
+DEFERRED = ("argparse", "datetime", "json", "shutil", "dataclasses", "inspect", "numpy")
+
+
+def _python(*args):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    env.pop("PYTHONDONTWRITEBYTECODE", None)  # measure with cached bytecode, as installed
+    return subprocess.run(
+        [sys.executable, *args], env=env, capture_output=True, text=True, check=True
+    )
+
+
+def _import_times(*args):
+    """Module -> self import time (µs) from `python -X importtime`."""
+    times = {}
+    for line in _python("-X", "importtime", *args).stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        own, _, name = line[len("import time:") :].split("|")
+        if own.strip().isdigit():
+            times[name.strip()] = int(own)
+    return times
+
+
+def test_library_import_defers_heavy_modules():
+    code = "import sys, cfs_postproc.cfs_postproc; print(' '.join(sorted(sys.modules)))"
+    loaded = set(_python("-c", code).stdout.split())
+    assert not loaded.intersection(DEFERRED)
+
+
+def test_cold_start_within_budget(tmp_path):
+    src = tmp_path / "in.gcode"
+    src.write_text("T0\n;LAYER_CHANGE\nT1\n", encoding="utf-8")
+    argv = ["-c", ENTRY, str(src), str(tmp_path / "out.gcode")]
+    _python(*argv)  # writes the bytecode caches
+    interpreter = _import_times("-c", "pass")
+    best = min(
+        sum(us for name, us in _import_times(*argv).items() if name not in interpreter)
+        for _ in range(3)
+    )
+    assert best / 1000 < COLD_START_BUDGET_MS, f"imports took {best / 1000:.1f} ms"
@@ -0,0 +1,52 @@
+import pathlib
+
+from cfs_postproc.cfs_postproc import Options, process_data, process_file, process_stream
+from cfs_postproc.stream import iter_lines
+
+OPTIONS = Options(precut_park_xy="10,20", m118_sentinels=True)
+
+
+def test_iter_lines_matches_splitlines(tmp_path: pathlib.Path):
+    data = b"a\r\nb\rc\n\n\x0cd\xe2\x80\xa8e \xff\r\r\nlast"
+    p = tmp_path / "in.gcode"
+    p.write_bytes(data)
+    for size in (1, 2, 3, 64):
+        assert list(iter_lines(p, size)) == data.splitlines(keepends=True)
+
+
+def test_stream_output_matches_in_memory(tmp_path: pathlib.Path):
+    infile = tmp_path / "in.gcode"
+    infile.write_text(
+        "; flush_multiplier = 0.5\nT0\nG1 X1\nT1\r\nT1\nT3 ; c\n"
+        "; flush_volumes_matrix = " + ",".join(["100"] * 16) + "\n",
+        encoding="utf-8",
+    )
+    a, b = tmp_path / "a.gcode", tmp_path / "b.gcode"
+    process_file(infile, a, OPTIONS)
+    for size in (1, 5, 1 << 20):
+        process_stream(infile, b, OPTIONS, buffer_size=size)
+        # Skip the timestamped first header line
+        assert b.read_bytes().split(b"\n", 1)[1] == a.read_bytes().split(b"\n", 1)[1]
+
+
+def test_line_endings_and_bytes_preserved(tmp_path: pathlib.Path):
+    data = b"; flush_multiplier = 0.5\r\nT0\r\nG1 X1 ; \xff\r\nT1\r\nG1 X2"
+    out, hdr = process_data(data, OPTIONS)
+    head, body = out.split(b"\r\n\r\n", 1)
+    assert head.decode("utf-8").split("\r\n") == hdr
+    assert body.startswith(b"; flush_multiplier = 1.0\r\nT0\r\nG1 X1 ; \xff\r\n")
+    assert b"\r\nM118 [INJECT] TRANSITION T0 -> T1; Start\r\n" in body
+    assert body.endswith(b"\r\nT1\r\nM118 [INJECT] TRANSITION T0 -> T1; End\r\nG1 X2")
+    assert b"\n" not in body.replace(b"\r\n", b"")
+
+    text, _ = process_data(data.decode("utf-8", errors="surrogateescape"), OPTIONS)
+    assert text.encode("utf-8", errors="surrogateescape").split(b"\r\n", 1)[1] == (
+        out.split(b"\r\n", 1)[1]
+    )
+
+    infile, a, b = tmp_path / "in.gcode", tmp_path / "a.gcode", tmp_path / "b.gcode"
+    infile.write_bytes(data)
+    process_file(infile, a, OPTIONS)
+    process_stream(infile, b, OPTIONS, buffer_size=3)
+    assert a.read_bytes().split(b"\r\n", 1)[1] == out.split(b"\r\n", 1)[1]
+    assert b.read_bytes().split(b"\r\n", 1)[1] == out.split(b"\r\n", 1)[1]